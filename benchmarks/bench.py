@@ -0,0 +1,318 @@
+"""
+    headless benchmarks of the notebook workloads
+
+    Every (case, size) runs in a fresh process so that the peak RSS belongs
+    to that case alone. Results (wall time, peak RSS, per-phase timings)
+    are written as JSON and can be compared against a stored baseline:
+
+        python3 benchmarks/bench.py -o results.json
+        python3 benchmarks/bench.py -o new.json --baseline results.json
+        python3 benchmarks/bench.py --cases heat1d burgers --sizes small
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class Phases:
+    """
+        accumulates wall times of named phases (mesh/assemble/factor/solve/draw)
+    """
+    def __init__(self):
+        self.times = {}
+
+    @contextmanager
+    def __call__(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[name] = self.times.get(name, 0) + time.perf_counter() - start
+
+def UseDirectory(name):
+    # the notebooks import their helpers from the working directory
+    sys.path.insert(0, os.path.join(root, name))
+
+def Headless():
+    import matplotlib
+    matplotlib.use("Agg")
+
+### cases: each gets the size parameter and a Phases object
+
+def BenchMesh1D(N, phase):
+    UseDirectory("fem_crash")
+    from mesh1d import Mesh1D
+    with phase("mesh"):
+        Mesh1D(N)
+
+def BenchDraw1D(N, phase):
+    Headless()
+    UseDirectory("fem_crash")
+    from mesh1d import Mesh1D
+    from draw1d import Draw1D
+    from ngsolve import H1, GridFunction, sin, x
+    with phase("mesh"):
+        mesh = Mesh1D(N)
+    gf = GridFunction(H1(mesh, order=3))
+    gf.Set(sin(10*x))
+    with phase("draw"):
+        Draw1D(mesh, [(gf,"u"), (sin(10*x),"f")], n_p=10)
+
+def BenchSpy(N, phase):
+    Headless()
+    UseDirectory("fem_crash")
+    from specials import CachedH1, CachedLaplace
+    from sparsity import SciPyMatrix
+    with phase("mesh"):
+        CachedH1(N, 3).mesh
+    with phase("assemble"):
+        SciPyMatrix(CachedLaplace(N, 3))
+
+def BenchHeat1D(N, phase):
+    Headless()
+    UseDirectory("fem_crash")
+    from specials import CachedH1, HeatOperator, HeatRHS
+    from ngsolve import GridFunction
+    params = dict(boundary_condition_left="Robin", boundary_condition_right="Dirichlet",
+                  r_value_left=1, r_value_right=1, intervalsize=1)
+    with phase("mesh"):
+        CachedH1(N, 2, interval=(0,1), dirichlet=(2,)).mesh
+    with phase("factor"):
+        fes, a, inv = HeatOperator(N, 2, 50, 50, **params)
+    with phase("assemble"):
+        gf = GridFunction(fes)
+        f = gf.vec.CreateVector()
+        HeatRHS(fes, gf.vec, f, N, 30000, 30000, value_left=20, value_right=20, **params)
+    with phase("solve"):
+        f.data -= a.mat * gf.vec
+        gf.vec.data += inv * f
+
+def BenchBurgers(N, phase):
+    UseDirectory("npde3")
+    from timestepping import FVMStepper
+    from ngsolve import CoefficientFunction, IfPos, x
+    from ngsolve.meshes import Make1DMesh
+    def F(u):
+        return 0.5*u**2
+    def fhatn_LF(F,u1,u2,n):
+        # Lax-Friedrichs flux, the wave speed is bounded by 1 for this data
+        return 0.5*F(u1)*n+0.5*F(u2)*n + 0.5*(u1-u2)
+    with phase("mesh"):
+        mesh = Make1DMesh(n=N)
+        ubnd_dir = {"right" : 1, "left" : 0}
+        ubnd = CoefficientFunction([ubnd_dir[key] for key in mesh.GetBoundaries()])
+    with phase("assemble"):
+        stepper = FVMStepper(F, fhatn_LF, IfPos(x-0.5,1,0), ubnd, mesh, 1/N,
+                             redraw=lambda gf: None)
+    with phase("solve"):
+        stepper.Run(0.4)
+
+def BenchBurgersMUSCL(N, phase):
+    UseDirectory("npde3")
+    from muscl import MUSCLStepper
+    from fluxes import fhatn_LF
+    from ngsolve import CoefficientFunction, IfPos, x
+    from ngsolve.meshes import Make1DMesh
+    def F(u):
+        return 0.5*u**2
+    with phase("mesh"):
+        mesh = Make1DMesh(n=N)
+        ubnd_dir = {"right" : 1, "left" : 0}
+        ubnd = CoefficientFunction([ubnd_dir[key] for key in mesh.GetBoundaries()])
+    with phase("assemble"):
+        stepper = MUSCLStepper(F, fhatn_LF, IfPos(x-0.5,1,0), ubnd, mesh, 0.5/N,
+                               limiter="MC", redraw=lambda gf: None)
+    with phase("solve"):
+        stepper.Run(0.4)
+
+def BenchShallowMUSCL(N, phase):
+    UseDirectory("npde3")
+    from muscl import MUSCLStepper
+    from fluxes import Rusanov, ShallowWaterF, ShallowWaterSpeed
+    from ngsolve import CoefficientFunction, exp, x
+    from ngsolve.meshes import Make1DMesh
+    def smoothed_jump(leftval, rightval, jumpposition, layerwidth):
+        t = 4/layerwidth*(x-jumpposition)
+        return leftval + (0.5*(exp(t)-exp(-t))/(exp(t)+exp(-t))+0.5)*(rightval-leftval)
+    g = 9.81
+    with phase("mesh"):
+        mesh = Make1DMesh(n=N, periodic=True)
+    with phase("assemble"):
+        h0 = smoothed_jump(0,1,0.4,0.1)+smoothed_jump(1,0,0.6,0.1)
+        stepper = MUSCLStepper(ShallowWaterF(g), Rusanov(ShallowWaterSpeed(g)),
+                               CoefficientFunction((h0,0)), None, mesh, 0.5/(6*N), dim=2,
+                               limiter="vanLeer", periodic=True, redraw=lambda gf: None)
+    with phase("solve"):
+        stepper.Run(0.1)
+
+def BenchTheta(level, phase, theta=0.5):
+    from ngsolve import (Mesh, H1, BilinearForm, LinearForm, GridFunction, Parameter,
+                         grad, dx, sin, cos, x, y, sqrt, Integrate)
+    from netgen.geom2d import SplineGeometry
+    from math import pi
+    i, j = level, level
+    with phase("mesh"):
+        geo = SplineGeometry()
+        geo.AddRectangle( (0, 0), (1, 1), bcs = ("bottom", "right", "top", "left"))
+        mesh = Mesh( geo.GenerateMesh(maxh=0.5**i))
+    fes = H1(mesh, order=4, dirichlet="bottom|right|left|top")
+    u,v = fes.TnT()
+    dt = 0.5**j
+    with phase("assemble"):
+        s = BilinearForm(fes, symmetric=False)
+        s += grad(u)*grad(v)*dx
+        s.Assemble()
+        m = BilinearForm(fes, symmetric=False)
+        m += u*v*dx
+        m.Assemble()
+    with phase("factor"):
+        mstar = m.mat.CreateMatrix()
+        mstar.AsVector().data = m.mat.AsVector() + theta * dt * s.mat.AsVector()
+        invmstar = mstar.Inverse(freedofs=fes.FreeDofs())
+    with phase("solve"):
+        t = Parameter(0.0)
+        fnow = LinearForm(fes)
+        fnow += sin(2*pi*x)*sin(2*pi*y)*(8*pi**2*cos(4*pi*t) - 4*pi*sin(4*pi*t))*v*dx
+        fnext = LinearForm(fes)
+        fnext += sin(2*pi*x)*sin(2*pi*y)*(8*pi**2*cos(4*pi*(t+dt)) - 4*pi*sin(4*pi*(t+dt)))*v*dx
+        uex = lambda t: sin(2*pi*x)*sin(2*pi*y)*cos(4*pi*t)
+        gfu = GridFunction(fes)
+        gfu.Set(uex(0.))
+        res = gfu.vec.CreateVector()
+        tn = 0
+        while tn < 1 - 0.5 * dt:
+            t.Set(tn)
+            fnow.Assemble()
+            fnext.Assemble()
+            res.data = (1-theta)*dt * fnow.vec + theta*dt*fnext.vec - dt * s.mat * gfu.vec
+            gfu.vec.data += invmstar * res
+            tn += dt
+            sqrt(Integrate((gfu-uex(tn))**2, mesh))
+
+def BenchNavierStokes(maxh, phase):
+    from ngsolve import (Mesh, Parameter, VectorH1, L2, NumberSpace, FESpace, BilinearForm,
+                         GridFunction, CoefficientFunction, InnerProduct, grad, div, dx, x, TRIG)
+    from ngsolve.solvers import Newton
+    from netgen.geom2d import unit_square
+    with phase("mesh"):
+        mesh = Mesh (unit_square.GenerateMesh(maxh=maxh))
+    with phase("assemble"):
+        Re = Parameter(1)
+        V = VectorH1(mesh,order=2,dirichlet="bottom|right|top|left")
+        V.SetOrder(TRIG,3); V.Update()
+        Q = L2(mesh,order=1)
+        N = NumberSpace(mesh)
+        X = FESpace([V,Q,N])
+        (u,p,lam), (v,q,mu) = X.TnT()
+        a = BilinearForm(X)
+        a += (1/Re*InnerProduct(grad(u),grad(v))+InnerProduct(grad(u)*u,v)
+              -div(u)*q-div(v)*p-lam*q-mu*p)*dx
+        gfu = GridFunction(X)
+        gfu.components[0].Set(CoefficientFunction((x*(1-x),0)),
+                              definedon=mesh.Boundaries("top"))
+    with phase("solve"):
+        Newton(a,gfu,maxit=20,dampfactor=1,printing=False)
+        Re.Set(50)
+        Newton(a,gfu,dampfactor=0.5,printing=False)
+
+cases = {
+    "mesh1d" : (BenchMesh1D, {"small" : 1000, "medium" : 100000, "large" : 1000000}),
+    "draw1d" : (BenchDraw1D, {"small" : 100, "medium" : 10000, "large" : 100000}),
+    "spy" : (BenchSpy, {"small" : 100, "medium" : 10000, "large" : 100000}),
+    "heat1d" : (BenchHeat1D, {"small" : 100, "medium" : 10000, "large" : 100000}),
+    "burgers" : (BenchBurgers, {"small" : 80, "medium" : 800, "large" : 8000}),
+    "burgers-muscl" : (BenchBurgersMUSCL, {"small" : 40, "medium" : 400, "large" : 4000}),
+    "shallow-muscl" : (BenchShallowMUSCL, {"small" : 32, "medium" : 256, "large" : 2048}),
+    "theta" : (BenchTheta, {"small" : 3, "medium" : 4, "large" : 5}),
+    "navierstokes" : (BenchNavierStokes, {"small" : 0.2, "medium" : 0.1, "large" : 0.05}),
+}
+
+def RunCase(case, size):
+    """
+        run one case in this process, returns the result dict
+    """
+    bench, sizes = cases[case]
+    phase = Phases()
+    start = time.perf_counter()
+    bench(sizes[size], phase)
+    wall = time.perf_counter() - start
+    return { "case" : case, "size" : size, "n" : sizes[size],
+             "wall" : wall, "phases" : phase.times,
+             # ru_maxrss is in kB on Linux
+             "peak_rss_mb" : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 }
+
+def RunIsolated(case, size):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", case, size],
+                         stdout=subprocess.PIPE, universal_newlines=True, cwd=root)
+    if out.returncode != 0:
+        return { "case" : case, "size" : size, "error" : out.returncode }
+    # the workloads may print, the result is the last line
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def Compare(results, baseline, tolerance):
+    """
+        print wall time ratios against baseline, returns the number of
+        cases slower than baseline by more than tolerance
+    """
+    old = { (r["case"], r["size"]) : r for r in baseline["results"] if "wall" in r }
+    slower = 0
+    print("{:14s} {:7s} {:>10s} {:>10s} {:>7s}".format("case", "size", "base [s]", "new [s]", "ratio"))
+    for r in results:
+        key = (r["case"], r["size"])
+        if "wall" not in r or key not in old:
+            continue
+        ratio = r["wall"] / old[key]["wall"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  slower"
+            slower += 1
+        elif ratio < 1 - tolerance:
+            flag = "  faster"
+        print("{:14s} {:7s} {:10.4f} {:10.4f} {:7.2f}{}".format(r["case"], r["size"], old[key]["wall"], r["wall"], ratio, flag))
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmarks of the notebook workloads")
+    parser.add_argument("--cases", nargs="+", choices=list(cases), default=list(cases))
+    parser.add_argument("--sizes", nargs="+", choices=["small", "medium", "large"], default=["small", "medium"])
+    parser.add_argument("-o", "--output", default="benchmark-results.json")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative slowdown reported as regression")
+    parser.add_argument("--child", nargs=2, metavar=("CASE", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(RunCase(*args.child)))
+        return
+
+    results = []
+    for case in args.cases:
+        for size in args.sizes:
+            r = RunIsolated(case, size)
+            if "error" in r:
+                print("{:14s} {:7s} failed".format(case, size))
+            else:
+                print("{:14s} {:7s} {:8.3f}s {:8.1f}MB  ".format(case, size, r["wall"], r["peak_rss_mb"])
+                      + " ".join("{}={:.3f}".format(k, v) for k, v in r["phases"].items()))
+            results.append(r)
+
+    with open(args.output, "w") as f:
+        json.dump({ "python" : platform.python_version(), "machine" : platform.node(),
+                    "date" : time.strftime("%Y-%m-%d %H:%M:%S"), "results" : results }, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if Compare(results, baseline, args.tolerance) > 0:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
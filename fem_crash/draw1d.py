@@ -1,59 +1,97 @@
-import matplotlib.pyplot as plt
+import os
+import importlib
+
+import numpy as np
 from numpy import nan
 
-from IPython import display
+class LazyModule:
+    """
+        module proxy that imports the module on first attribute access
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
 
-def Draw1D(mesh, coefs, keep=False, n_p=2, figsize=(20,4)):
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+# matplotlib and IPython are only imported on the first Draw1D call
+plt = LazyModule("matplotlib.pyplot")
+display = LazyModule("IPython.display")
+
+backends = ["matplotlib", "headless"]
+backend = os.environ.get("NGS_DRAW_BACKEND", "matplotlib")
+if backend not in backends:
+    backend = "matplotlib"
+
+def SetBackend(name):
     """
-        draw coefficient functions with matplotlib
+        "matplotlib" or "headless" (Draw1D draws nothing)
+    """
+    global backend
+    if name not in backends:
+        raise Exception("unknown drawing backend " + name + ", use one of " + ", ".join(backends))
+    backend = name
+
+from mesh1d import GetGeometry1D
+
+def Sample1D(mesh, coefs, n_p=2, eps=1e-6):
+    """
+        sample coefficient functions on all elements of a 1D mesh at once
     arguments:
         mesh: ngsolve.comp.Mesh
-            Mesh (1D) on that functions should be drawn
+            Mesh (1D) on that functions should be sampled
         coefs: list of tuples, e.g. [(a,"a"),(b,"b")]
             first component of tuple is assumed to be a coefficient function
             second component is assumed to be a string that is used as a label
         n_p: int
             number of sampling points on every element (minimum is 2)
+    returns:
+        x_s, f_s, x_v: sampling points (elements separated by nan), dict
+            label -> sampled values (same layout as x_s) and vertex coordinates
     """
     if n_p <= 2:
         n_p = 2
-        
-    eps = 1e-6 
-    
-    x_v = [p[0] for p in mesh.ngmesh.Points()]
-    x_s = []
-    f_s = {}
 
-    miny = 1e99
+    geo = GetGeometry1D(mesh)
+    x_el, mips = geo.SamplePoints(mesh, n_p, eps)
+
+    def with_separators(vals):
+        vals = np.hstack([vals, np.full((vals.shape[0],1), nan)])
+        return np.hstack([[nan], vals.ravel()])
+
+    x_s = with_separators(x_el)
+    f_s = {}
     for f, name in coefs:
-        f_s[name] = []
-        
-    x_s.append(nan)
-    for f,name in coefs:
-        f_s[name].append(nan)
-        
-    for el in mesh.ngmesh.Elements1D():
-        left = mesh.ngmesh.Points()[el.points[0]][0]
-        right = mesh.ngmesh.Points()[el.points[1]][0]
-        for l in range(n_p):
-            y = left + eps + (l / (n_p-1)) * (right - eps -left) 
-            x_s.append(y)
-            for f,name in coefs:
-                ff = f(mesh(y))
-                miny = min(miny,ff)
-                f_s[name].append(ff)
-                
-        x_s.append(nan)
-        for f,name in coefs:
-            f_s[name].append(nan)
-
-        
+        vals = np.asarray(f(mips)).reshape(x_el.size, -1)[:,0]
+        f_s[name] = with_separators(vals.reshape(x_el.shape))
+    return x_s, f_s, geo.vertices
+
+def Draw1D(mesh, coefs, keep=False, n_p=2, figsize=(20,4)):
+    """
+        draw coefficient functions with matplotlib
+    arguments:
+        mesh: ngsolve.comp.Mesh
+            Mesh (1D) on that functions should be drawn
+        coefs: list of tuples, e.g. [(a,"a"),(b,"b")]
+            first component of tuple is assumed to be a coefficient function
+            second component is assumed to be a string that is used as a label
+        n_p: int
+            number of sampling points on every element (minimum is 2)
+    """
+    if backend == "headless":
+        return
+    x_s, f_s, x_v = Sample1D(mesh, coefs, n_p=n_p)
+    miny = min([np.nanmin(vals) for vals in f_s.values()], default=0)
+
     # plt.clf()
     # display.display(plt.gcf())
     plt.figure(figsize=figsize)
     for f,name in coefs:
         plt.plot(x_s,f_s[name],label=name)
-    plt.plot(x_v,[miny for v in x_v],'|',label='Knoten')
+    plt.plot(x_v,np.full(len(x_v),miny),'|',label='Knoten')
     plt.xlabel("x")
     plt.legend()
     plt.show()
@@ -1,25 +1,133 @@
 from netgen.meshing import Mesh as NGMesh
-from netgen.meshing import MeshPoint, Element1D, Element0D, Pnt
+from netgen.meshing import MeshPoint, Element1D, Element0D, Pnt, PointId
 from ngsolve import Mesh as NGSMesh
+import numpy as np
+
+class Geometry1D:
+    """
+        contiguous arrays describing the geometry of a 1D mesh
+    members:
+        vertices: numpy array of the point coordinates
+        elements: numpy array (ne x 2) of (0-based) point numbers of the elements
+        left, right, lengths: numpy arrays of element end points and lengths
+    """
+    def __init__(self, vertices, elements):
+        self.vertices = np.ascontiguousarray(vertices, dtype=float)
+        self.elements = np.ascontiguousarray(elements, dtype=int).reshape(-1,2)
+        ends = self.vertices[self.elements]
+        self.left = np.ascontiguousarray(ends.min(axis=1))
+        self.right = np.ascontiguousarray(ends.max(axis=1))
+        self.lengths = self.right - self.left
+        self.samples = {}
+
+    @staticmethod
+    def FromMesh(mesh):
+        ngmesh = mesh.ngmesh
+        vertices = [p[0] for p in ngmesh.Points()]
+        elements = [(el.points[0].nr-1, el.points[1].nr-1) for el in ngmesh.Elements1D()]
+        return Geometry1D(vertices, elements)
+
+    def SamplePoints(self, mesh, n_p, eps=1e-6):
+        """
+            n_p sampling points per element (array ne x n_p) and the
+            corresponding mesh points, computed once per n_p
+        """
+        if (n_p, eps) not in self.samples:
+            ref = np.linspace(0, 1, n_p)
+            x_el = (self.left+eps)[:,None] + ref[None,:] * (self.lengths-2*eps)[:,None]
+            self.samples[(n_p, eps)] = (x_el, mesh(x_el.ravel()))
+        return self.samples[(n_p, eps)]
+
+_geometries = {}
+max_cached_geometries = 32
+
+def _MeshSignature(mesh):
+    return (mesh.nv, mesh.ne)
+
+def SetGeometry1D(mesh, geo):
+    """
+        store geo as the cached geometry of mesh
+    """
+    _geometries.pop(id(mesh), None)
+    _geometries[id(mesh)] = (mesh, _MeshSignature(mesh), geo)
+    while len(_geometries) > max_cached_geometries:
+        del _geometries[next(iter(_geometries))]
+
+def GetGeometry1D(mesh):
+    """
+        cached Geometry1D of a (1D) mesh, rebuilt if the mesh has changed
+    """
+    entry = _geometries.get(id(mesh))
+    if entry is not None and entry[0] is mesh and entry[1] == _MeshSignature(mesh):
+        return entry[2]
+    geo = Geometry1D.FromMesh(mesh)
+    SetGeometry1D(mesh, geo)
+    return geo
+
+def InvalidateGeometry1D(mesh=None):
+    """
+        drop the cached geometry of mesh (of all meshes if mesh is None),
+        e.g. after moving mesh points
+    """
+    if mesh is None:
+        _geometries.clear()
+    else:
+        _geometries.pop(id(mesh), None)
+
+
+def UniformNodes(N, interval=(0,1)):
+    """
+        N+1 equidistant nodes on interval
+    """
+    return np.linspace(interval[0], interval[1], N+1)
+
+def GradedNodes(N, interval=(0,1), ratio=1.1):
+    """
+        N+1 nodes on interval with geometrically growing cells,
+        h_{i+1} = ratio * h_i (ratio < 1 grades towards the right end)
+    """
+    if ratio == 1:
+        return UniformNodes(N, interval)
+    h = ratio ** np.arange(N)
+    s = np.hstack([[0], np.cumsum(h)]) / h.sum()
+    return interval[0] + s * (interval[1]-interval[0])
+
+def ChebyshevNodes(N, interval=(0,1)):
+    """
+        N+1 Chebyshev-Lobatto nodes on interval (clustered at both ends)
+    """
+    s = 0.5 - 0.5 * np.cos(np.pi * np.arange(N+1) / N)
+    return interval[0] + s * (interval[1]-interval[0])
 
 def Mesh1D(elements, interval=(0,1), periodic=False):
     """
-        generate an equidistant 1D mesh with N cells
+        generate a 1D mesh
+    arguments:
+        elements: int or array of node coordinates
+            number of cells N of an equidistant mesh on interval, or the
+            (N+1) nodes of the mesh, e.g. from GradedNodes or ChebyshevNodes
+            (interval is ignored then)
+        periodic: bool
+            identify the left and the right end point
     """
-    N = elements
-    left = interval[0]
-    right = interval[1]
+    if np.ndim(elements) == 0:
+        nodes = UniformNodes(elements, interval)
+    else:
+        nodes = np.sort(np.asarray(elements, dtype=float))
+    N = len(nodes) - 1
     mesh = NGMesh(dim=1)
-    pids = []
-    for i in range(N+1):
-        pids.append (mesh.Add (MeshPoint(Pnt(left + i/N * (right-left), 0, 0))))
-    for i in range(N):
-        mesh.Add(Element1D([pids[i],pids[i+1]],index=1))
-    mesh.Add (Element0D( pids[0], index=1))
-    mesh.Add (Element0D( pids[N], index=2))
+    pnts = np.zeros((N+1,3))
+    pnts[:,0] = nodes
+    mesh.AddPoints(pnts)
+    els = np.column_stack([np.arange(N), np.arange(1,N+1)])
+    mesh.AddElements(dim=1, index=1, data=els, base=0)
+    first, last = PointId(1), PointId(N+1)
+    mesh.Add (Element0D( first, index=1))
+    mesh.Add (Element0D( last, index=2))
     mesh.SetBCName(0,"left")
     mesh.SetBCName(1,"right")
     if periodic:
-        mesh.AddPointIdentification(pids[0],pids[N],1,2)
+        mesh.AddPointIdentification(first,last,1,2)
     ngsmesh = NGSMesh(mesh) 
+    SetGeometry1D(ngsmesh, Geometry1D(nodes, els))
     return ngsmesh
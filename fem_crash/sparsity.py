@@ -0,0 +1,70 @@
+"""
+    scipy views of assembled NGSolve matrices and sparsity plots for large matrices
+"""
+
+from math import ceil
+
+import numpy as np
+
+# scipy matrices sharing the values of NGSolve matrices, per matrix
+_matrices = {}
+max_cached_matrices = 8
+
+def SciPyMatrix(mat):
+    """
+        scipy.sparse.csr_matrix of an assembled NGSolve SparseMatrix; only
+        the values are shared, the index arrays are converted once (the row
+        pointer is a size_t buffer, scipy needs signed indices); cached per
+        matrix, so a re-assembled matrix (with the same pattern) shows up
+        with its new values
+    """
+    entry = _matrices.get(id(mat))
+    if entry is not None and entry[0] is mat:
+        return entry[1]
+
+    import scipy.sparse as sp
+    vals, cols, rowptr = mat.CSR()
+    indices = np.asarray(cols, dtype=np.int64)
+    indptr = np.asarray(rowptr, dtype=np.int64)
+    A = sp.csr_matrix((np.asarray(vals), indices, indptr),
+                      shape=(mat.height, mat.width), copy=False)
+    # the values buffer belongs to mat
+    A.ngsolve_matrix = mat
+
+    _matrices[id(mat)] = (mat, A)
+    while len(_matrices) > max_cached_matrices:
+        del _matrices[next(iter(_matrices))]
+    return A
+
+def BlockDensity(A, max_pixels=512):
+    """
+        number of nonzeros per block of rows and columns, so that the
+        image has at most max_pixels pixels per direction
+    returns:
+        the image and the block size
+    """
+    n, m = A.shape
+    bs = max(1, ceil(max(n, m) / max_pixels))
+    nr, nc = ceil(n / bs), ceil(m / bs)
+    rows = np.repeat(np.arange(n) // bs, np.diff(A.indptr))
+    cols = A.indices // bs
+    img = np.bincount(rows * nc + cols, minlength=nr * nc).reshape(nr, nc)
+    return img, bs
+
+def SpyMatrix(A, max_pixels=512, figsize=(7,7), **kwargs):
+    """
+        plot the sparsity pattern of A with plt.spy, for matrices larger than
+        max_pixels as image of the block-aggregated density
+    arguments:
+        kwargs: passed on to plt.spy for small matrices
+    """
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=figsize)
+    if max(A.shape) <= max_pixels:
+        plt.spy(A, **kwargs)
+    else:
+        img, bs = BlockDensity(A, max_pixels)
+        plt.imshow(img / bs**2, cmap="Greys", interpolation="nearest",
+                   extent=(-0.5, A.shape[1]-0.5, A.shape[0]-0.5, -0.5))
+        plt.colorbar(label="density per {}x{} block".format(bs, bs))
+    plt.show()
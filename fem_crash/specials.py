@@ -1,6 +1,16 @@
-import matplotlib.pyplot as plt
 from random import random
-from math import *
+import math
+from math import pi, floor, ceil
+
+from draw1d import LazyModule
+from sparsity import SciPyMatrix, SpyMatrix
+
+# plotting and widget modules are only imported when needed
+plt = LazyModule("matplotlib.pyplot")
+
+# globals of the smooth_function expressions, a copy so that eval never
+# changes the math module
+_math_names = dict(vars(math))
 
 def DrawSpecialFunction(N=1):
     if N < 1:
@@ -21,7 +31,8 @@ def DrawSpecialFunction(N=1):
     
 def DrawErrorToSmoothFunction(N=10, smooth_function= "sin(2*pi*x)"):
     try:
-        f = lambda x: eval(smooth_function)
+        # math functions only, the notebooks star-import ngsolve's sin etc.
+        f = lambda x: eval(smooth_function, _math_names, {"x" : x})
         f(0.5)
     except:
         print("expression for smooth_function not valid!")
@@ -80,10 +91,47 @@ from ngsolve import H1, GridFunction
 from ngsolve import x as X
 from ngsolve import sin as Sin
 from ngsolve import cos as Cos
+from ngsolve import BilinearForm, Discontinuous, grad, SymbolicBFI
+
+from functools import lru_cache
+
+# meshes, spaces and assembled matrices are reused between slider events;
+# the caches are bounded, call ClearCaches() to free everything
+max_cached = 16
+
+@lru_cache(maxsize=max_cached)
+def CachedMesh1D(N, interval):
+    return Mesh1D(N, interval=interval)
+
+@lru_cache(maxsize=max_cached)
+def CachedH1(N, order, interval=(0,1), dirichlet=(), dg=False):
+    """
+        H1 space (Discontinuous H1 for dg=True) on CachedMesh1D(N, interval)
+    """
+    fes = H1(CachedMesh1D(N, interval), order=order, dirichlet=list(dirichlet))
+    if dg:
+        fes = Discontinuous(fes)
+    return fes
+
+@lru_cache(maxsize=max_cached)
+def CachedLaplace(N, order, dg=False):
+    """
+        assembled matrix of (grad u, grad v) on CachedH1(N, order, dg=dg)
+    """
+    fes = CachedH1(N, order, dg=True) if dg else CachedH1(N, order)
+    u,v = fes.TnT()
+    a = BilinearForm(fes)
+    a += SymbolicBFI(grad(u)*grad(v))
+    a.Assemble()
+    return a.mat
+
+def ClearCaches():
+    for f in [CachedMesh1D, CachedH1, CachedLaplace, CachedHeatOperator]:
+        f.cache_clear()
 
 def DrawBasisFunction(N=4, i=0, order=1):
-   mesh1D = Mesh1D(N)
-   fes = H1(mesh1D, order=order)
+   fes = CachedH1(N, order)
+   mesh1D = fes.mesh
    gf = GridFunction(fes)
    
    gf.vec[:] = 0
@@ -105,14 +153,14 @@ def ApproximateWithFESpace(N=64, order=3, f="sin(3·pi·x)"):
         print("no function provided")
         return
         
-    mesh1D = Mesh1D(N)
+    mesh1D = CachedH1(N, order).mesh
     try:
         f(mesh1D(0.5))
     except:
         print("expression for f not valid!")
         return
     
-    fes = H1(mesh1D, order=order)
+    fes = CachedH1(N, order)
     gf = GridFunction(fes)
     gf.Set(f)
     Draw1D(mesh1D, [(gf,"FE Approximation"), (f,"exakte Funktion")], n_p=20)
@@ -133,14 +181,14 @@ def PartialApproximateWithFESpace(N=64, order=3, f="sin(3·pi·x)", j = 2):
         print("no function provided")
         return
         
-    mesh1D = Mesh1D(N)
+    mesh1D = CachedH1(N, order).mesh
     try:
         f(mesh1D(0.5))
     except:
         print("expression for f not valid!")
         return
     
-    fes = H1(mesh1D, order=order)
+    fes = CachedH1(N, order)
 
     if (i > fes.ndof):
         print( "j is too large. Setting j = ", fes.ndof-1)
@@ -158,13 +206,13 @@ def PartialApproximateWithFESpace(N=64, order=3, f="sin(3·pi·x)", j = 2):
 
 
 
-from ngsolve import IfPos, BilinearForm, LinearForm, H1, GridFunction, grad, SymbolicBFI, SymbolicLFI, Integrate
+from ngsolve import IfPos, BilinearForm, LinearForm, H1, GridFunction, grad, SymbolicBFI, SymbolicLFI, Integrate, MultiVector
 
 
 
 def ComputeMatrixEntry2(N=8, order=1, k=1, i=0, j=0 ):
-    mesh1D = Mesh1D(N)
-    fes = H1(mesh1D, order=order) #, dirichlet=)
+    fes = CachedH1(N, order)
+    mesh1D = fes.mesh
 
     gf1 = GridFunction(fes)
     gf2 = GridFunction(fes)
@@ -179,6 +227,7 @@ def ComputeMatrixEntry2(N=8, order=1, k=1, i=0, j=0 ):
 from functools import partial
     
 def ComputeMatrixEntry(N=8, order=1, k=1):
+    from ipywidgets import interactive_output, IntSlider, HBox
     options = {
         "i" : IntSlider(min=0, max=N*order, step=1, continuous_update=True, description='i', value=0),
         "j" : IntSlider(min=0, max=N*order, step=1, continuous_update=True, description='j', value=0),
@@ -189,39 +238,81 @@ def ComputeMatrixEntry(N=8, order=1, k=1):
     display.display(ui, out)
     
 
-import scipy.sparse as sp
-
-import matplotlib.pylab as plt
-
 def Spy(N=8, order=1):
-    mesh1D = Mesh1D(N)
-    fes = H1(mesh1D, order=order) #, dirichlet=)
-    u,v = fes.TnT()
-    a = BilinearForm(fes)
-    a += SymbolicBFI(grad(u)*grad(v))
-    a.Assemble()
-    rows,cols,vals = a.mat.COO()
-    A = sp.csr_matrix((vals,(rows,cols)))
-    plt.figure(figsize=(7,7))
-    plt.spy(A)
-    plt.show()
+    SpyMatrix(SciPyMatrix(CachedLaplace(N, order, dg=False)))
 
 def SpyDG(N=8, order=1):
-    mesh1D = Mesh1D(N)
-    fes = Discontinuous(H1(mesh1D, order=order)) #, dirichlet=)
-    u,v = fes.TnT()
-    a = BilinearForm(fes)
-    a += SymbolicBFI(grad(u)*grad(v))
-    a.Assemble()
-    rows,cols,vals = a.mat.COO()
-    A = sp.csr_matrix((vals,(rows,cols)))
-    plt.figure(figsize=(7,7))
-    plt.spy(A)
-    plt.show()
+    SpyMatrix(SciPyMatrix(CachedLaplace(N, order, dg=True)))
     
     
 
 
+@lru_cache(maxsize=max_cached)
+def CachedHeatOperator(N, order, intervalsize, dirichlet, k1, k2, r_left, r_right):
+    """
+        space, assembled heat operator and its factorization for Heat1DFEM
+        (r_left/r_right are the Robin coefficients or None)
+    """
+    fes = CachedH1(N, order, interval=(0,intervalsize), dirichlet=dirichlet)
+    mesh1D = fes.mesh
+    k = IfPos(X-0.5*intervalsize,k2,k1)    
+        
+    u,v = fes.TnT()    
+    a = BilinearForm(fes)    
+    a += SymbolicBFI(k * grad(u) * grad(v))
+    if r_left is not None:
+        a += SymbolicBFI( r_left * u * v, definedon = mesh1D.Boundaries("left"))
+    if r_right is not None:
+        a += SymbolicBFI( r_right * u * v, definedon = mesh1D.Boundaries("right") )
+    a.Assemble()
+    return fes, a, a.mat.Inverse(fes.FreeDofs())
+
+def HeatOperator(N=8, order=1, k1=1, k2=1,
+                 boundary_condition_left="Robin", boundary_condition_right="Dirichlet",
+                 r_value_left=0, r_value_right=1, intervalsize=0.14):
+    """
+        (cached) space, operator and factorization for Heat1DFEM; depends
+        only on the parameters that enter the bilinear form
+    """
+    dbnds = []
+    if boundary_condition_left == "Dirichlet":
+        dbnds.append(1)
+    if boundary_condition_right == "Dirichlet":
+        dbnds.append(2)
+    # Robin coefficients only enter the operator for Robin conditions
+    r_left = r_value_left if boundary_condition_left == "Robin" else None
+    r_right = r_value_right if boundary_condition_right == "Robin" else None
+    return CachedHeatOperator(N, order, intervalsize, tuple(dbnds), k1, k2, r_left, r_right)
+
+def HeatRHS(fes, u, f, N, Q1=0, Q2=10,
+            boundary_condition_left="Robin", boundary_condition_right="Dirichlet",
+            value_left=0, value_right=1, q_value_left=0, q_value_right=1,
+            r_value_left=0, r_value_right=1, intervalsize=0.14):
+    """
+        write the Dirichlet values into the vector u and the load vector
+        (without Dirichlet lifting) into the vector f
+    """
+    u[:] = 0
+    if boundary_condition_left == "Dirichlet":
+        u[0] = value_left
+    if boundary_condition_right == "Dirichlet":
+        u[N] = value_right
+
+    Q = IfPos(X-0.5*intervalsize,Q2,Q1)    
+    v = fes.TestFunction()
+    lf = LinearForm(fes)
+    lf += SymbolicLFI(Q * v)
+    lf.Assemble()
+    f.data = lf.vec
+    if boundary_condition_left == "Neumann":
+        f[0] +=  q_value_left
+    elif boundary_condition_left == "Robin":
+        f[0] +=  r_value_left * value_left
+    if boundary_condition_right == "Neumann":
+        f[N] +=  q_value_right
+    elif boundary_condition_right == "Robin":
+        f[N] +=  r_value_right * value_right
+
 def Heat1DFEM( N=8,
                order=1, 
                k1 = 1, 
@@ -240,60 +331,66 @@ def Heat1DFEM( N=8,
     if (boundary_condition_left == "Neumann" or (boundary_condition_left == "Robin" and r_value_left==0)) and (boundary_condition_right == "Neumann" or (boundary_condition_right == "Robin" and r_value_right==0)):
         print("Temperatur ist nicht eindeutig bestimmt.")
         #return
-    mesh1D = Mesh1D(N,interval=(0,intervalsize))
-    dbnds = []
-    if boundary_condition_left == "Dirichlet":
-        dbnds.append(1)
-        # print(True)
-    if boundary_condition_right == "Dirichlet":
-        dbnds.append(2)
-    
-    fes = H1(mesh1D, order=order, dirichlet=dbnds)
+    bcs = dict(boundary_condition_left=boundary_condition_left,
+               boundary_condition_right=boundary_condition_right,
+               r_value_left=r_value_left, r_value_right=r_value_right,
+               intervalsize=intervalsize)
+    # refactorizes only if one of the operator parameters changed
+    fes, a, inv = HeatOperator(N, order, k1, k2, **bcs)
     gf = GridFunction(fes)
-        
-    if boundary_condition_left == "Dirichlet":
-        gf.vec[0] = value_left
-    
-    if boundary_condition_right == "Dirichlet":
-        gf.vec[N] = value_right
-
-       
-        
-    Q = IfPos(X-0.5*intervalsize,Q2,Q1)    
-    k = IfPos(X-0.5*intervalsize,k2,k1)    
-        
-    u,v = fes.TnT()    
-    a = BilinearForm(fes)    
-    a += SymbolicBFI(k * grad(u) * grad(v))
-    if boundary_condition_left == "Robin":
-        a += SymbolicBFI( r_value_left * u * v, definedon = mesh1D.Boundaries("left"))
-    if boundary_condition_right == "Robin":
-        a += SymbolicBFI( r_value_right * u * v, definedon = mesh1D.Boundaries("right") )
-    a.Assemble()
-    f = LinearForm(fes)
-    f += SymbolicLFI(Q * v)
-    f.Assemble()
-    if boundary_condition_left == "Neumann":
-        f.vec[0] +=  q_value_left
-    elif boundary_condition_left == "Robin":
-        f.vec[0] +=  r_value_left * value_left
-    if boundary_condition_right == "Neumann":
-        f.vec[N] +=  q_value_right
-    elif boundary_condition_right == "Robin":
-        f.vec[N] +=  r_value_right * value_right
-        
-    f.vec.data -= a.mat * gf.vec
-    gf.vec.data += a.mat.Inverse(fes.FreeDofs()) * f.vec
-    Draw1D(mesh1D,[(gf,"u_h")],n_p=5*order**2)            
+    f = gf.vec.CreateVector()
+    HeatRHS(fes, gf.vec, f, N, Q1, Q2,
+            value_left=value_left, value_right=value_right,
+            q_value_left=q_value_left, q_value_right=q_value_right, **bcs)
+    f.data -= a.mat * gf.vec
+    gf.vec.data += inv * f
+    Draw1D(fes.mesh,[(gf,"u_h")],n_p=5*order**2)            
+
+def Heat1DFEMBatch(rhs_parameters, N=8, order=1, k1=1, k2=1,
+                   boundary_condition_left="Robin", boundary_condition_right="Dirichlet",
+                   r_value_left=0, r_value_right=1, intervalsize=0.14, draw=True):
+    """
+        solve Heat1DFEM for many right hand sides with one operator
+    arguments:
+        rhs_parameters: list of dicts
+            each with (some of) Q1, Q2, value_left, value_right,
+            q_value_left, q_value_right
+        remaining arguments as in Heat1DFEM
+    returns:
+        list of GridFunctions, one per entry of rhs_parameters
+    """
+    bcs = dict(boundary_condition_left=boundary_condition_left,
+               boundary_condition_right=boundary_condition_right,
+               r_value_left=r_value_left, r_value_right=r_value_right,
+               intervalsize=intervalsize)
+    fes, a, inv = HeatOperator(N, order, k1, k2, **bcs)
+    m = len(rhs_parameters)
+    gf = GridFunction(fes)
+    U = MultiVector(gf.vec, m)
+    F = MultiVector(gf.vec, m)
+    for i, params in enumerate(rhs_parameters):
+        HeatRHS(fes, U[i], F[i], N, **params, **bcs)
+        F[i].data -= a.mat * U[i]
+    # one multi-vector solve for all right hand sides
+    W = MultiVector(gf.vec, m)
+    W[:] = inv * F
+
+    gfs = []
+    for i in range(m):
+        gfi = GridFunction(fes)
+        gfi.vec.data = U[i] + W[i]
+        gfs.append(gfi)
+    if draw:
+        Draw1D(fes.mesh,[(gfi,"u_h "+str(i)) for i, gfi in enumerate(gfs)],n_p=5*order**2)
+    return gfs
     
 def align(q):
     interactive_plot = q
     interactive_plot.layout.height = '500px'
     return interactive_plot
 
-from ipywidgets import interact, interactive_output, interact_manual, interactive, FloatSlider, IntSlider, Dropdown, HBox, VBox
-
 def Heat1DExample():
+    from ipywidgets import interactive_output, FloatSlider, Dropdown, HBox, VBox
     options = {
         "N" : Dropdown(description='N', index=1, options=(2, 3, 4, 8, 16, 32, 64), value=8),
         "order" : Dropdown(description='order', index=1, options=(1,2,3,4), value=1),
@@ -325,8 +422,13 @@ def Heat1DExample():
     
     display.display(ui, out)
 
-from ngsolve import *
-from ngsolve.webgui import Draw
+def Draw(*args, **kwargs):
+    """
+        ngsolve.webgui.Draw, imported on the first call
+    """
+    from ngsolve.webgui import Draw
+    return Draw(*args, **kwargs)
+
 class DrawBasisFunction2DiDrawer:
 
     def __init__(self, gfu):
@@ -345,6 +447,7 @@ class DrawBasisFunction2DiDrawer:
             
 
 def DrawBasisFunction2D(gfu):
+    from ipywidgets import interactive_output, IntSlider, HBox
     drawer = DrawBasisFunction2DiDrawer(gfu)
     options = {
         "i" : IntSlider(min=0, max=gfu.space.ndof-1, step=1, continuous_update=False, description='i', value=0),
@@ -0,0 +1,148 @@
+"""
+    adaptive mesh refinement (estimate - mark - refine) for the Poisson
+    problems of poisson.ipynb and intfprob_fitted.ipynb
+
+    The error is estimated by Zienkiewicz-Zhu flux recovery: the discrete
+    flux alpha*grad(u) is interpolated into an H(div) space, the element
+    contributions of the difference form the estimator. Elements are
+    marked with Doerfler's bulk criterion. After refinement the spaces and
+    GridFunctions are updated in place, so the solution is prolongated to
+    the new mesh and serves as initial guess for the multigrid
+    preconditioned CG solve.
+"""
+
+import time
+
+import numpy as np
+
+from ngsolve import GridFunction, HDiv, Preconditioner, Integrate, grad, VOL
+
+def ZZEstimator(gfu, gfflux, alpha=1):
+    """
+        squared element contributions of the ZZ estimator
+    arguments:
+        gfflux: GridFunction of an HDiv space for the recovered flux
+        alpha: diffusion coefficient
+    """
+    flux = alpha * grad(gfu)
+    gfflux.Set(flux)
+    err = 1/alpha * (flux - gfflux)**2
+    return np.asarray(Integrate(err, gfu.space.mesh, VOL, element_wise=True))
+
+def DoerflerMarking(mesh, eta2, theta=0.5):
+    """
+        mark the fewest elements with the largest contributions that sum
+        up to theta of the total estimator (squared), theta=1 marks all
+    returns:
+        number of marked elements
+    """
+    # theta >= 1 also marks the elements without contribution
+    marked = np.ones(len(eta2), dtype=bool)
+    if theta < 1:
+        order = np.argsort(eta2)[::-1]
+        partial = np.cumsum(eta2[order])
+        n = min(len(eta2), np.searchsorted(partial, theta * partial[-1]) + 1)
+        marked[:] = False
+        marked[order[:n]] = True
+    for el in mesh.Elements():
+        mesh.SetRefinementFlag(el, bool(marked[el.nr]))
+    return int(marked.sum())
+
+class AdaptiveSolver:
+    """
+        adaptive loop for a(u,v) = f(v) with homogeneous Dirichlet conditions
+    arguments:
+        fes, a, f, gfu: space, BilinearForm and LinearForm (not yet
+            assembled, the preconditioner is registered on a) and solution
+        alpha: diffusion coefficient of a, for the estimator
+        theta: Doerfler parameter, 1 gives uniform refinement
+        error: callable or None
+            returns the error of gfu (e.g. against an exact solution)
+        curve: int or None
+            re-curve the mesh to this order after every refinement
+        precond: preconditioner for CG, "multigrid" uses the refinement hierarchy
+        tol, maxiter: for CG
+    """
+    def __init__(self, fes, a, f, gfu, alpha=1, theta=0.5, error=None, curve=None,
+                 precond="multigrid", tol=1e-10, maxiter=1000):
+        self.fes = fes
+        self.mesh = fes.mesh
+        self.a = a
+        self.f = f
+        self.gfu = gfu
+        self.alpha = alpha
+        self.theta = theta
+        self.error = error
+        self.curve = curve
+        self.tol = tol
+        self.maxiter = maxiter
+        self.pre = Preconditioner(a, precond)
+        self.gfflux = GridFunction(HDiv(self.mesh, order=fes.globalorder-1))
+        self.log = []
+
+    def Solve(self):
+        """
+            assemble and solve with CG, starting from the current gfu
+        returns:
+            number of CG iterations
+        """
+        from ngsolve.krylovspace import CGSolver
+        self.a.Assemble()
+        self.f.Assemble()
+        solver = CGSolver(self.a.mat, self.pre.mat, tol=self.tol, maxiter=self.maxiter)
+        solver.Solve(rhs=self.f.vec, sol=self.gfu.vec, initialize=False)
+        return solver.iterations
+
+    def Refine(self):
+        self.mesh.Refine()
+        if self.curve is not None:
+            self.mesh.Curve(self.curve)
+        self.fes.Update()
+        # prolongates the solution of the coarser mesh
+        self.gfu.Update()
+        self.gfflux.space.Update()
+        self.gfflux.Update()
+
+    def Run(self, maxndof=100000, maxlevels=30, verbose=True):
+        """
+            estimate - mark - refine until fes.ndof exceeds maxndof
+        returns:
+            list of dicts with ndof, estimator, error, iterations and time per level
+        """
+        for level in range(maxlevels):
+            start = time.perf_counter()
+            iterations = self.Solve()
+            eta2 = ZZEstimator(self.gfu, self.gfflux, self.alpha)
+            step = { "level" : level, "ndof" : self.fes.ndof, "elements" : self.mesh.ne,
+                     "estimator" : np.sqrt(eta2.sum()), "iterations" : iterations,
+                     "error" : self.error() if self.error is not None else None }
+            if self.fes.ndof >= maxndof or level == maxlevels-1:
+                step["time"] = time.perf_counter() - start
+                self.log.append(step)
+                if verbose:
+                    self.Print(step)
+                break
+            step["marked"] = DoerflerMarking(self.mesh, eta2, self.theta)
+            self.Refine()
+            step["time"] = time.perf_counter() - start
+            self.log.append(step)
+            if verbose:
+                self.Print(step)
+        return self.log
+
+    def Print(self, step):
+        print("level {:3d}: ndof {:8d}, estimator {:.4e}{}, {} CG its, {:.2f}s".format(
+            step["level"], step["ndof"], step["estimator"],
+            "" if step["error"] is None else ", error {:.4e}".format(step["error"]),
+            step["iterations"], step["time"]))
+
+def CompareLogs(logs, key="estimator"):
+    """
+        ndof needed per method to get below the final value of key of the
+        coarsest run, e.g. CompareLogs({"adaptive" : log1, "uniform" : log2}, "error")
+    """
+    target = max(log[-1][key] for log in logs.values())
+    for name, log in logs.items():
+        reached = [step for step in log if step[key] <= target]
+        print("{:>10s}: {} {:.4e} with {} dofs".format(name, key, reached[0][key], reached[0]["ndof"]) if reached
+              else "{:>10s}: {} {:.4e} not reached".format(name, key, target))
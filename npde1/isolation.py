@@ -0,0 +1,28 @@
+"""
+    runs in a fresh process, for timings and peak memory per run
+
+    The processes are spawned, not forked: a forked child's peak resident
+    memory includes the pages of the parent (the notebook), and forking a
+    process that runs netgen's GUI (Tk threads) is unsafe.
+"""
+
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+def _Measured(function, args):
+    result = function(*args)
+    # ru_maxrss is in kB on Linux
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+def RunIsolated(function, *args):
+    """
+        function(*args) in a new process
+    arguments:
+        function: module level function returning a dict
+    returns:
+        the dict, with the peak memory of the process in "peak_rss_mb"
+    """
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_Measured, function, args).result()
@@ -0,0 +1,123 @@
+"""
+    geometric multigrid preconditioned CG for the Poisson problem of
+    poisson.ipynb, as replacement of the sparsecholesky solve
+
+    The mesh hierarchy is built by uniform refinement of the coarse mesh.
+    The multigrid preconditioner is registered on the BilinearForm before
+    the first assembly and gets a new level with every assembly on a
+    refined mesh; the coarsest level is solved directly.
+"""
+
+import time
+
+from ngsolve import (Mesh, H1, BilinearForm, LinearForm, GridFunction, Preconditioner,
+                     grad, dx, x)
+from netgen.geom2d import unit_square
+
+from isolation import RunIsolated
+
+class PoissonSolver:
+    """
+        -laplace u = x on the unit square, u = 0 on bottom and right
+    arguments:
+        maxh: mesh size of the coarse mesh
+        levels: number of uniform refinements
+        order: order of the H1 space
+        method: "multigrid" (CG) or "cholesky" (sparsecholesky on the finest level)
+        smoother: smoother of the multigrid preconditioner, "point", "line" or "block"
+        tol, maxiter: for CG
+    """
+    def __init__(self, maxh=0.2, levels=0, order=2, method="multigrid", smoother="point",
+                 tol=1e-10, maxiter=500):
+        if method not in ("multigrid", "cholesky"):
+            raise ValueError("unknown method '{}', use 'multigrid' or 'cholesky'".format(method))
+        if smoother not in ("point", "line", "block"):
+            raise ValueError("unknown smoother '{}', use 'point', 'line' or 'block'".format(smoother))
+        self.method = method
+        self.tol = tol
+        self.maxiter = maxiter
+        self.times = { "mesh" : 0, "assemble" : 0, "setup" : 0, "solve" : 0 }
+        self.iterations = None
+
+        start = time.perf_counter()
+        self.mesh = Mesh(unit_square.GenerateMesh(maxh=maxh))
+        self.fes = H1(self.mesh, order=order, dirichlet="bottom|right")
+        u, v = self.fes.TnT()
+        self.a = BilinearForm(self.fes, symmetric=True)
+        self.a += grad(u)*grad(v)*dx
+        self.f = LinearForm(self.fes)
+        self.f += x*v*dx
+        self.pre = None
+        if method == "multigrid":
+            self.pre = Preconditioner(self.a, "multigrid", smoother=smoother, inverse="sparsecholesky")
+        self.times["mesh"] += time.perf_counter() - start
+
+        for level in range(levels + 1):
+            if level > 0:
+                start = time.perf_counter()
+                self.mesh.Refine()
+                self.fes.Update()
+                self.times["mesh"] += time.perf_counter() - start
+            # the preconditioner needs every level, the direct solver only the finest
+            if method == "multigrid" or level == levels:
+                start = time.perf_counter()
+                self.a.Assemble()
+                self.times["assemble"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        self.f.Assemble()
+        self.gfu = GridFunction(self.fes)
+        self.times["assemble"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        if method == "cholesky":
+            self.inv = self.a.mat.Inverse(freedofs=self.fes.FreeDofs(), inverse="sparsecholesky")
+        else:
+            from ngsolve.krylovspace import CGSolver
+            self.inv = CGSolver(self.a.mat, self.pre.mat, tol=tol, maxiter=maxiter)
+        self.times["setup"] += time.perf_counter() - start
+
+    def Solve(self):
+        start = time.perf_counter()
+        self.gfu.vec.data = self.inv * self.f.vec
+        if self.method == "multigrid":
+            self.iterations = self.inv.iterations
+        self.times["solve"] += time.perf_counter() - start
+        return self.gfu
+
+def _Run(method, levels, kwargs):
+    solver = PoissonSolver(levels=levels, method=method, **kwargs)
+    solver.Solve()
+    return { "method" : method, "levels" : levels, "ndof" : solver.fes.ndof,
+             "iterations" : solver.iterations, "times" : solver.times }
+
+def ScalingStudy(levels, methods=("multigrid", "cholesky"), max_cholesky_levels=None,
+                 verbose=True, **kwargs):
+    """
+        iterations, setup (assembly incl. preconditioner or factorization)
+        and solve time and peak memory per refinement level, every run in
+        its own (spawned) process
+    arguments:
+        levels: numbers of refinements, e.g. range(8)
+        max_cholesky_levels: skip the direct solver above this level
+        kwargs: passed on to PoissonSolver
+    returns:
+        list of result dicts
+    """
+    results = []
+    if verbose:
+        print("{:>6s} {:>9s} {:>10s} {:>5s} {:>10s} {:>10s} {:>12s} {:>10s}".format(
+            "level", "method", "ndof", "its", "setup [s]", "solve [s]", "us per dof", "peak [MB]"))
+    for level in levels:
+        for method in methods:
+            if method == "cholesky" and max_cholesky_levels is not None and level > max_cholesky_levels:
+                continue
+            r = RunIsolated(_Run, method, level, kwargs)
+            results.append(r)
+            if verbose:
+                # the multigrid levels are set up during assembly
+                setup = r["times"]["assemble"] + r["times"]["setup"]
+                print("{:6d} {:>9s} {:10d} {:>5s} {:10.3f} {:10.3f} {:12.3f} {:10.1f}".format(
+                    level, method, r["ndof"], "-" if r["iterations"] is None else str(r["iterations"]),
+                    setup, r["times"]["solve"], 1e6 * (setup + r["times"]["solve"]) / r["ndof"], r["peak_rss_mb"]))
+    return results
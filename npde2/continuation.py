@@ -0,0 +1,101 @@
+"""
+    parameter continuation for nonlinear problems (e.g. the Reynolds number
+    in navierstokes.ipynb) with a Newton method that reuses the Jacobian
+    factorization (chord / Shamanskii steps) while it converges fast enough
+"""
+
+import time
+
+from ngsolve import Projector, Norm
+
+class NewtonContinuation:
+    """
+        Newton's method for the BilinearForm a (a(u,v) = 0 for all free v)
+        with a kept factorization of the Jacobian
+    arguments:
+        a: (nonlinear) BilinearForm
+        gfu: GridFunction, initial guess incl. Dirichlet values, updated in place
+        freedofs: BitArray, default gfu.space.FreeDofs()
+        inverse: sparse direct solver for the Jacobian
+        tol: float
+            stop if the norm of the residual (on the free dofs) is below tol
+        maxit: int
+            maximal number of Newton steps per parameter value
+        max_rate: float
+            a new Jacobian is factorized as soon as the residual is reduced
+            by less than this factor in a step
+        dampfactor: float
+            damping of the Newton update
+    """
+    def __init__(self, a, gfu, freedofs=None, inverse="umfpack", tol=1e-10, maxit=50,
+                 max_rate=0.5, dampfactor=1):
+        self.a = a
+        self.gfu = gfu
+        self.freedofs = freedofs if freedofs is not None else gfu.space.FreeDofs()
+        self.inverse = inverse
+        self.tol = tol
+        self.maxit = maxit
+        self.max_rate = max_rate
+        self.dampfactor = dampfactor
+        self.projector = Projector(self.freedofs, True)
+        self.res = gfu.vec.CreateVector()
+        self.w = gfu.vec.CreateVector()
+        self.inv = None
+        self.factorizations = 0
+        self.log = []
+
+    def Factorize(self):
+        self.a.AssembleLinearization(self.gfu.vec)
+        self.inv = self.a.mat.Inverse(self.freedofs, inverse=self.inverse)
+        self.factorizations += 1
+
+    def Residual(self):
+        self.a.Apply(self.gfu.vec, self.res)
+        self.w.data = self.projector * self.res
+        return Norm(self.w)
+
+    def Solve(self):
+        """
+            Newton iteration starting from gfu with the kept factorization
+        returns:
+            list of residual norms
+        """
+        norms = [self.Residual()]
+        if self.inv is None:
+            self.Factorize()
+        for it in range(self.maxit):
+            if norms[-1] < self.tol:
+                break
+            self.w.data = self.inv * self.res
+            self.gfu.vec.data -= self.dampfactor * self.w
+            norms.append(self.Residual())
+            if norms[-1] >= self.tol and norms[-1] > self.max_rate * norms[-2]:
+                self.Factorize()
+        return norms
+
+    def Run(self, parameter, schedule, verbose=True):
+        """
+            solve for all values of schedule (in this order), every solve
+            starts from the previous solution and factorization
+        arguments:
+            parameter: Parameter in a, e.g. Re
+            schedule: list of values for parameter
+        returns:
+            list of dicts with value, iterations, factorizations,
+            residuals and wall time per continuation step
+        """
+        for value in schedule:
+            parameter.Set(value)
+            start = time.perf_counter()
+            factorizations = self.factorizations
+            norms = self.Solve()
+            step = { "value" : value, "iterations" : len(norms)-1,
+                     "factorizations" : self.factorizations - factorizations,
+                     "residuals" : norms, "time" : time.perf_counter() - start,
+                     "converged" : norms[-1] < self.tol }
+            self.log.append(step)
+            if verbose:
+                print("value {:g}: {} steps, {} factorizations, residual {:.3e} -> {:.3e}, {:.2f}s{}".format(
+                    value, step["iterations"], step["factorizations"], norms[0], norms[-1], step["time"],
+                    "" if step["converged"] else "  NOT CONVERGED"))
+        return self.log
@@ -1,83 +1,349 @@
 #from pyvista import set_plot_theme
 #set_plot_theme('document')
 
-from ngsolve import VTKOutput, CoefficientFunction, Mesh
 # from IPython import get_ipython
 # ipython = get_ipython()
 # ipython.magic("matplotlib inline")
-try:
-    from ngsolve.webgui import Draw
-    print("Using NGSolve's 'Draw' from webgui!")
-except ImportError:
-    from netgen import gui
-    from ngsolve import Draw
-    print("Spawning NGSolve's GUI with standard 'Draw' function")
-
-import matplotlib.pyplot as plt
+
+# the drawing backends (webgui, netgen's gui, matplotlib, IPython) are only
+# imported on the first Draw/Draw1D call, the resolved backend is kept
+import os
+import importlib
+
+import numpy as np
 from numpy import nan
 
-from IPython import display
+class LazyModule:
+    """
+        module proxy that imports the module on first attribute access
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
 
-def Draw1D(mesh, coefs, keep=False, n_p=2, figsize=(20,4)):
+plt = LazyModule("matplotlib.pyplot")
+display = LazyModule("IPython.display")
+
+backends = ["auto", "webgui", "gui", "headless", "file"]
+_backend = None
+_Draw3D = None
+_writer = None
+
+def SetBackend(name=None, **options):
     """
-        draw coefficient functions with matplotlib
+        choose the drawing backend
+    arguments:
+        name: "webgui", "gui" (netgen's GUI), "headless" (draws nothing and
+            imports no GUI stack), "file" (writes frames, see FrameWriter)
+            or "auto"/None (webgui, falling back to gui);
+            default is the environment variable NGS_DRAW_BACKEND or "auto"
+        options: passed on to FrameWriter for the "file" backend
+    returns:
+        the resolved backend
+    """
+    global _backend, _Draw3D, _writer
+    if name is None:
+        name = os.environ.get("NGS_DRAW_BACKEND", "auto")
+    if name not in backends:
+        raise Exception("unknown drawing backend " + name + ", use one of " + ", ".join(backends))
+    if name in ["auto", "webgui"]:
+        try:
+            from ngsolve.webgui import Draw as _Draw3D
+            print("Using NGSolve's 'Draw' from webgui!")
+            _backend = "webgui"
+            return _backend
+        except ImportError:
+            if name == "webgui":
+                raise
+    if name == "headless":
+        _Draw3D = lambda *args, **kwargs: None
+        _backend = "headless"
+    elif name == "file":
+        _writer = FrameWriter(**options)
+        _Draw3D = _writer.Draw
+        _backend = "file"
+    else:
+        from netgen import gui
+        from ngsolve import Draw as _Draw3D
+        print("Spawning NGSolve's GUI with standard 'Draw' function")
+        _backend = "gui"
+    return _backend
+
+def Backend():
+    """
+        the drawing backend, resolved on the first call
+    """
+    if _backend is None:
+        SetBackend()
+    return _backend
+
+class Geometry1D:
+    """
+        contiguous arrays describing the geometry of a 1D mesh
+    members:
+        vertices: numpy array of the point coordinates
+        elements: numpy array (ne x 2) of (0-based) point numbers of the elements
+        left, right, lengths: numpy arrays of element end points and lengths
+    """
+    def __init__(self, vertices, elements):
+        self.vertices = np.ascontiguousarray(vertices, dtype=float)
+        self.elements = np.ascontiguousarray(elements, dtype=int).reshape(-1,2)
+        ends = self.vertices[self.elements]
+        self.left = np.ascontiguousarray(ends.min(axis=1))
+        self.right = np.ascontiguousarray(ends.max(axis=1))
+        self.lengths = self.right - self.left
+        self.samples = {}
+
+    @staticmethod
+    def FromMesh(mesh):
+        ngmesh = mesh.ngmesh
+        vertices = [p[0] for p in ngmesh.Points()]
+        elements = [(el.points[0].nr-1, el.points[1].nr-1) for el in ngmesh.Elements1D()]
+        return Geometry1D(vertices, elements)
+
+    def SamplePoints(self, mesh, n_p, eps=1e-6):
+        """
+            n_p sampling points per element (array ne x n_p) and the
+            corresponding mesh points, computed once per n_p
+        """
+        if (n_p, eps) not in self.samples:
+            ref = np.linspace(0, 1, n_p)
+            x_el = (self.left+eps)[:,None] + ref[None,:] * (self.lengths-2*eps)[:,None]
+            self.samples[(n_p, eps)] = (x_el, mesh(x_el.ravel()))
+        return self.samples[(n_p, eps)]
+
+_geometries = {}
+max_cached_geometries = 32
+
+def _MeshSignature(mesh):
+    return (mesh.nv, mesh.ne)
+
+def SetGeometry1D(mesh, geo):
+    """
+        store geo as the cached geometry of mesh
+    """
+    _geometries.pop(id(mesh), None)
+    _geometries[id(mesh)] = (mesh, _MeshSignature(mesh), geo)
+    while len(_geometries) > max_cached_geometries:
+        del _geometries[next(iter(_geometries))]
+
+def GetGeometry1D(mesh):
+    """
+        cached Geometry1D of a (1D) mesh, rebuilt if the mesh has changed
+    """
+    entry = _geometries.get(id(mesh))
+    if entry is not None and entry[0] is mesh and entry[1] == _MeshSignature(mesh):
+        return entry[2]
+    geo = Geometry1D.FromMesh(mesh)
+    SetGeometry1D(mesh, geo)
+    return geo
+
+def InvalidateGeometry1D(mesh=None):
+    """
+        drop the cached geometry of mesh (of all meshes if mesh is None),
+        e.g. after moving mesh points
+    """
+    if mesh is None:
+        _geometries.clear()
+    else:
+        _geometries.pop(id(mesh), None)
+
+def Sample1D(mesh, coefs, n_p=2, eps=1e-6):
+    """
+        sample coefficient functions on all elements of a 1D mesh at once
     arguments:
         mesh: ngsolve.comp.Mesh
-            Mesh (1D) on that functions should be drawn
+            Mesh (1D) on that functions should be sampled
         coefs: list of tuples, e.g. [(a,"a"),(b,"b")]
             first component of tuple is assumed to be a coefficient function
             second component is assumed to be a string that is used as a label
         n_p: int
             number of sampling points on every element (minimum is 2)
+    returns:
+        x_s, f_s, x_v: sampling points (elements separated by nan), dict
+            label -> sampled values (same layout as x_s) and vertex coordinates
     """
     if n_p <= 2:
         n_p = 2
-        
-    eps = 1e-6 
-    
-    x_v = [p[0] for p in mesh.ngmesh.Points()]
-    x_s = []
-    f_s = {}
 
-    miny = 1e99
+    geo = GetGeometry1D(mesh)
+    x_el, mips = geo.SamplePoints(mesh, n_p, eps)
+
+    def with_separators(vals):
+        vals = np.hstack([vals, np.full((vals.shape[0],1), nan)])
+        return np.hstack([[nan], vals.ravel()])
+
+    x_s = with_separators(x_el)
+    f_s = {}
     for f, name in coefs:
-        f_s[name] = []
-        
-    x_s.append(nan)
-    for f,name in coefs:
-        f_s[name].append(nan)
-        
-    for el in mesh.ngmesh.Elements1D():
-        left = mesh.ngmesh.Points()[el.points[0]][0]
-        right = mesh.ngmesh.Points()[el.points[1]][0]
-        for l in range(n_p):
-            y = left + eps + (l / (n_p-1)) * (right - eps -left) 
-            x_s.append(y)
-            for f,name in coefs:
-                ff = f(mesh(y))
-                miny = min(miny,ff)
-                f_s[name].append(ff)
-                
-        x_s.append(nan)
-        for f,name in coefs:
-            f_s[name].append(nan)
-
-        
+        vals = np.asarray(f(mips)).reshape(x_el.size, -1)[:,0]
+        f_s[name] = with_separators(vals.reshape(x_el.shape))
+    return x_s, f_s, geo.vertices
+
+class Figure1D:
+    """
+        figure with one line per label (and the vertices); later draws with
+        the same labels only replace the data of the existing Line2D artists
+    """
+    def __init__(self, fig, labels, x_s, f_s, x_v):
+        self.fig = fig
+        self.labels = labels
+        self.ax = fig.add_subplot(1,1,1)
+        miny = min([np.nanmin(vals) for vals in f_s.values()], default=0)
+        self.lines = [self.ax.plot(x_s,f_s[name],label=name)[0] for name in labels]
+        self.vertices, = self.ax.plot(x_v,np.full(len(x_v),miny),'|',label='vertices')
+        self.ax.set_xlabel("x")
+        self.ax.legend()
+        self.handle = None
+
+    def Matches(self, labels, figsize):
+        return labels == self.labels and self.fig.get_size_inches().tolist() == list(figsize)
+
+    def SetData(self, x_s, f_s, x_v):
+        miny = min([np.nanmin(vals) for vals in f_s.values()], default=0)
+        for line, name in zip(self.lines, self.labels):
+            line.set_data(x_s, f_s[name])
+        self.vertices.set_data(x_v, np.full(len(x_v),miny))
+        self.ax.relim()
+        self.ax.autoscale_view()
+
+# figures of Draw1D(..., key=...), the oldest ones are closed beyond max_figures
+_figures = {}
+max_figures = 8
+
+def Draw1D(mesh, coefs, keep=False, n_p=2, figsize=(20,4), key=None):
+    """
+        draw coefficient functions with matplotlib
+    arguments:
+        mesh: ngsolve.comp.Mesh
+            Mesh (1D) on that functions should be drawn
+        coefs: list of tuples, e.g. [(a,"a"),(b,"b")]
+            first component of tuple is assumed to be a coefficient function
+            second component is assumed to be a string that is used as a label
+        n_p: int
+            number of sampling points on every element (minimum is 2)
+        key: hashable or None
+            if given, the figure of the last call with this key is reused and
+            its output replaced (for animations in time loops)
+    """
+    if Backend() == "headless":
+        return
+    if Backend() == "file":
+        return _writer.Draw1D(mesh, coefs, n_p=n_p, figsize=figsize)
+    x_s, f_s, x_v = Sample1D(mesh, coefs, n_p=n_p)
+    labels = [name for f,name in coefs]
+
+    if key is not None:
+        figure = _figures.pop(key, None)
+        if figure is not None and figure.Matches(labels, figsize):
+            figure.SetData(x_s, f_s, x_v)
+            if figure.handle is not None:
+                figure.handle.update(figure.fig)
+            else:
+                # no IPython kernel, no display handle to update
+                figure.fig.canvas.draw_idle()
+                plt.show()
+        else:
+            figure = Figure1D(plt.figure(figsize=figsize), labels, x_s, f_s, x_v)
+            figure.handle = display.display(figure.fig, display_id=True)
+            if figure.handle is not None:
+                # closed figures can still be displayed, but are not kept by pyplot
+                plt.close(figure.fig)
+            else:
+                # outside IPython the figure stays open for plt.show()
+                plt.show()
+        _figures[key] = figure
+        while len(_figures) > max_figures:
+            plt.close(_figures.pop(next(iter(_figures))).fig)
+        return figure
+
     # plt.clf()
     # display.display(plt.gcf())
-    plt.figure(figsize=figsize)
-    for f,name in coefs:
-        plt.plot(x_s,f_s[name],label=name)
-    plt.plot(x_v,[miny for v in x_v],'|',label='vertices')
-    plt.xlabel("x")
-    plt.legend()
+    Figure1D(plt.figure(figsize=figsize), labels, x_s, f_s, x_v)
     plt.show()
     if keep:
         display.clear_output(wait=True)
     
+class FrameWriter:
+    """
+        headless drawing into numbered files in a directory
+    arguments:
+        directory: str
+            output directory (created if necessary)
+        format: "png", "svg" or "npz"
+            image per Draw1D call, or the sampled arrays (x, values per
+            label, vertices) as compressed numpy archive
+        every: int
+            only every every-th call writes a frame
+        prefix: str
+            file names are prefix + frame number + "." + format
+    1D functions are drawn into one reused figure whose line artists only
+    get new data; other meshes are written as VTK files.
+    """
+    def __init__(self, directory="frames", format="png", every=1, prefix="frame"):
+        if format not in ["png", "svg", "npz"]:
+            raise Exception("unknown frame format " + format)
+        self.directory = directory
+        self.format = format
+        self.every = max(1, every)
+        self.prefix = prefix
+        self.calls = 0
+        self.frames = 0
+        self.figure = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _NextFile(self, ext):
+        # returns None if the frame is skipped
+        self.calls += 1
+        if (self.calls-1) % self.every != 0:
+            return None
+        filename = os.path.join(self.directory, "{}{:05d}.{}".format(self.prefix, self.frames, ext))
+        self.frames += 1
+        return filename
+
+    def Draw1D(self, mesh, coefs, n_p=2, figsize=(20,4)):
+        filename = self._NextFile(self.format)
+        if filename is None:
+            return None
+        x_s, f_s, x_v = Sample1D(mesh, coefs, n_p=n_p)
+        labels = [name for f,name in coefs]
+        if self.format == "npz":
+            np.savez_compressed(filename, x=x_s, vertices=x_v, labels=np.array(labels, dtype=str),
+                                values=np.array([f_s[name] for name in labels]))
+            return filename
+        if self.figure is None or not self.figure.Matches(labels, figsize):
+            from matplotlib.figure import Figure
+            self.figure = Figure1D(Figure(figsize=figsize), labels, x_s, f_s, x_v)
+        else:
+            self.figure.SetData(x_s, f_s, x_v)
+        self.figure.fig.savefig(filename)
+        return filename
+
+    def Draw(self, cf_or_mesh, mesh=None, label=None, *args, **kwargs):
+        if mesh is None:
+            if not hasattr(cf_or_mesh, "space"):
+                # a mesh alone, nothing to animate
+                return None
+            mesh = cf_or_mesh.space.mesh
+        filename = self._NextFile("vtu")
+        if filename is None:
+            return None
+        from ngsolve import VTKOutput
+        VTKOutput(ma=mesh, coefs=[cf_or_mesh], names=[label if label else "u"],
+                  filename=filename[:-4], subdivision=kwargs.get("subdivision", 0)).Do()
+        return filename
+
 print("* 1D Drawing available with patched 'Draw' or simply 'Draw1D'")
 
-oldDraw = Draw
+def oldDraw(*args, **kwargs):
+    Backend()
+    return _Draw3D(*args, **kwargs)
+
 def Draw(cf_or_mesh,mesh=None,label=None,*args,**kwargs):
     if mesh == None:
         ret = oldDraw(cf_or_mesh)
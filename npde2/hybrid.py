@@ -0,0 +1,141 @@
+"""
+    solvers for the hybrid mixed method of hybrid.ipynb
+
+    With static condensation the local unknowns (sigma, u) are eliminated
+    element by element, the global system only couples the facet unknowns
+    uhat. It is solved directly (sparse Cholesky) or with preconditioned CG;
+    the monolithic saddle point system is kept for comparison.
+"""
+
+import time
+
+from ngsolve import BilinearForm, GridFunction, Preconditioner, Projector
+
+class HybridSolver:
+    """
+        assemble and solve a(gf, v) = f(v) for all free v
+    arguments:
+        X: (compound) FESpace, e.g. FESpace([V,Q,F])
+        form: integrals of the bilinear form, e.g.
+            (...)*dx + (...)*dx(element_boundary=True)
+        condense: bool
+            eliminate the element-local unknowns, False: monolithic system
+        solver: "direct" or "cg"
+            cg is only available for the condensed (definite) system
+        inverse: sparse direct solver, default sparsecholesky if condensed
+            and umfpack otherwise
+        precond: preconditioner type for cg, e.g. "bddc" or "local"
+        tol, maxiter: for cg
+    """
+    def __init__(self, X, form, condense=True, solver="direct", inverse=None,
+                 precond="bddc", tol=1e-10, maxiter=1000):
+        if solver not in ("direct", "cg"):
+            raise ValueError("unknown solver '{}', use 'direct' or 'cg'".format(solver))
+        if solver == "cg" and not condense:
+            raise ValueError("cg needs condense=True, the full system is indefinite")
+        self.X = X
+        self.condense = condense
+        self.solver = solver
+        if inverse is None:
+            inverse = "sparsecholesky" if condense else "umfpack"
+        self.inverse = inverse
+        self.tol = tol
+        self.maxiter = maxiter
+        self.freedofs = X.FreeDofs(condense)
+        self.times = { "assemble" : 0, "setup" : 0, "solve" : 0 }
+        self.iterations = None
+
+        self.a = BilinearForm(X, condense=condense)
+        self.a += form
+        self.pre = Preconditioner(self.a, precond) if solver == "cg" else None
+
+        start = time.perf_counter()
+        self.a.Assemble()
+        setup = time.perf_counter()
+        if solver == "direct":
+            self.inv = self.a.mat.Inverse(freedofs=self.freedofs, inverse=inverse)
+        else:
+            from ngsolve.krylovspace import CGSolver
+            self.inv = CGSolver(self.a.mat, self.pre.mat, tol=tol, maxiter=maxiter)
+        self.times["assemble"] = setup - start
+        self.times["setup"] = time.perf_counter() - setup
+        self.projector = Projector(self.freedofs, True)
+
+    def Solve(self, f, gf):
+        """
+            solve with right hand side f (assembled LinearForm), gf contains
+            the Dirichlet values (and zeros elsewhere) on entry and the
+            solution on exit
+        """
+        start = time.perf_counter()
+        r = f.vec.CreateVector()
+        r.data = f.vec - self.a.mat * gf.vec
+        if self.condense:
+            r.data += self.a.harmonic_extension_trans * r
+        r.data = self.projector * r
+        gf.vec.data += self.inv * r
+        if self.condense:
+            gf.vec.data += self.a.harmonic_extension * gf.vec
+            gf.vec.data += self.a.inner_solve * f.vec
+        self.times["solve"] = time.perf_counter() - start
+        if self.solver == "cg":
+            self.iterations = self.inv.iterations
+        return gf
+
+    def Nze(self):
+        """
+            number of nonzeros of the global matrix
+        """
+        return self.a.mat.nze
+
+    def Report(self):
+        print("{} ({}{}): {} nonzeros, {} free dofs, ".format(
+            "condensed" if self.condense else "monolithic",
+            self.solver if self.solver == "cg" else self.inverse,
+            "" if self.iterations is None else ", {} iterations".format(self.iterations),
+            self.Nze(), self.freedofs.NumSet())
+              + ", ".join("{} {:.3e}s".format(k, v) for k, v in self.times.items()))
+
+def HybridSolve(X, form, f, gf, condense=True, **kwargs):
+    """
+        solve with a HybridSolver, see there for the arguments
+    returns:
+        the solver (for Report)
+    """
+    solver = HybridSolver(X, form, condense=condense, **kwargs)
+    solver.Solve(f, gf)
+    return solver
+
+def CompareHybrid(X, form, f, gf, solvers=None):
+    """
+        solve with the monolithic and the condensed system(s), starting from
+        a copy of gf (only Dirichlet values) each time, and print nonzeros,
+        timings and the difference to the monolithic solution
+    arguments:
+        solvers: list of dicts of HybridSolver arguments, default the
+            monolithic, the condensed direct and the condensed cg solve
+    returns:
+        dict: name -> (solver, solution)
+    """
+    if solvers is None:
+        solvers = [ { "condense" : False },
+                    { "condense" : True, "solver" : "direct" },
+                    { "condense" : True, "solver" : "cg" } ]
+    results = {}
+    reference = None
+    for kwargs in solvers:
+        gfs = GridFunction(X)
+        gfs.vec.data = gf.vec
+        solver = HybridSolve(X, form, f, gfs, **kwargs)
+        name = "{}-{}".format("condensed" if solver.condense else "monolithic", solver.solver)
+        solver.Report()
+        if reference is None:
+            reference = solver, gfs
+        else:
+            diff = gfs.vec.CreateVector()
+            diff.data = gfs.vec - reference[1].vec
+            total = lambda s: s.times["setup"] + s.times["solve"]
+            print("    difference {:.3e}, nonzeros {:.1f}x, setup+solve {:.1f}x less".format(
+                diff.Norm(), reference[0].Nze() / solver.Nze(), total(reference[0]) / max(total(solver), 1e-12)))
+        results[name] = solver, gfs
+    return results
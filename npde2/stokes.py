@@ -0,0 +1,216 @@
+"""
+    solvers for the Taylor-Hood Stokes problem of stokes.ipynb
+
+    StokesDirect factorizes the full system with the NumberSpace constraint
+    as in the notebook. StokesMinRes solves the velocity-pressure system
+    with MinRes and a block-diagonal preconditioner: BDDC or multigrid for
+    the velocity Laplacian and the (Jacobi of the) pressure mass matrix for
+    the Schur complement. The constant pressure mode is removed by
+    projecting to mean-zero pressures instead of the NumberSpace.
+"""
+
+import time
+
+from ngsolve import (Mesh, VectorH1, H1, NumberSpace, FESpace, BilinearForm, LinearForm,
+                     GridFunction, CoefficientFunction, Preconditioner, Projector, BaseMatrix,
+                     BlockMatrix, BlockVector, InnerProduct, grad, div, dx, x)
+from netgen.geom2d import unit_square
+
+from isolation import RunIsolated
+
+def StokesMesh(maxh):
+    return Mesh(unit_square.GenerateMesh(maxh=maxh))
+
+# lid velocity of the notebook
+lid = CoefficientFunction((x*(1-x),0))
+
+class MeanZeroProjection(BaseMatrix):
+    """
+        p -> p - (int p / |Omega|) for pressure coefficient vectors,
+        the transpose removes the constant from functionals
+    """
+    def __init__(self, Q):
+        BaseMatrix.__init__(self)
+        q = Q.TestFunction()
+        mean = LinearForm(Q)
+        mean += q*dx
+        mean.Assemble()
+        one = GridFunction(Q)
+        one.Set(1)
+        self.mean = mean.vec
+        self.one = one.vec
+        self.area = InnerProduct(self.mean, self.one)
+
+    def Mult(self, x, y):
+        y.data = x
+        y.data -= InnerProduct(self.mean, x) / self.area * self.one
+
+    def MultTrans(self, x, y):
+        y.data = x
+        y.data -= InnerProduct(self.one, x) / self.area * self.mean
+
+    def Height(self):
+        return len(self.one)
+
+    def Width(self):
+        return len(self.one)
+
+    def CreateColVector(self):
+        return self.one.CreateVector()
+
+    def CreateRowVector(self):
+        return self.one.CreateVector()
+
+class StokesDirect:
+    """
+        Taylor-Hood system with NumberSpace, sparse direct solve
+    arguments:
+        mesh: Mesh
+        order: velocity order, pressure order-1
+        inverse: sparse direct solver
+    """
+    def __init__(self, mesh, order=2, inverse="umfpack"):
+        self.mesh = mesh
+        Vh = VectorH1(mesh,order=order,dirichlet="bottom|right|top|left")
+        Qh = H1(mesh,order=order-1)
+        Nh = NumberSpace(mesh)
+        self.Wh = Wh = FESpace([Vh,Qh,Nh])
+        self.inverse = inverse
+        self.times = { "assemble" : 0, "setup" : 0, "solve" : 0 }
+        self.iterations = None
+
+        (u,p,lam), (v,q,mu) = Wh.TnT()
+        start = time.perf_counter()
+        self.a = BilinearForm(Wh)
+        self.a += (InnerProduct(grad(u),grad(v))-div(u)*q-div(v)*p-lam*q-mu*p)*dx
+        self.a.Assemble()
+        setup = time.perf_counter()
+        self.inv = self.a.mat.Inverse(Wh.FreeDofs(), inverse=inverse)
+        self.times["assemble"] = setup - start
+        self.times["setup"] = time.perf_counter() - setup
+
+    def Solve(self, ubnd=lid, bnd="top"):
+        """
+            returns:
+                velocity and pressure GridFunctions
+        """
+        start = time.perf_counter()
+        gfu = GridFunction(self.Wh)
+        gfu.components[0].Set(ubnd, definedon=self.mesh.Boundaries(bnd))
+        f = gfu.vec.CreateVector()
+        f.data = -self.a.mat * gfu.vec
+        gfu.vec.data += self.inv * f
+        self.times["solve"] = time.perf_counter() - start
+        return gfu.components[0], gfu.components[1]
+
+    def Ndof(self):
+        return self.Wh.ndof
+
+class StokesMinRes:
+    """
+        Taylor-Hood system without NumberSpace, preconditioned MinRes
+    arguments:
+        mesh: Mesh
+        order: velocity order, pressure order-1
+        precond: preconditioner for the velocity block, "bddc" or
+            "multigrid" (together with refinements)
+        refinements: int
+            refine mesh (in place) this many times, the preconditioner is
+            updated on every level
+        tol, maxiter: for MinRes
+    """
+    def __init__(self, mesh, order=2, precond="bddc", refinements=0, tol=1e-10, maxiter=1000):
+        self.mesh = mesh
+        self.V = V = VectorH1(mesh,order=order,dirichlet="bottom|right|top|left")
+        self.Q = Q = H1(mesh,order=order-1)
+        self.tol = tol
+        self.maxiter = maxiter
+        self.times = { "assemble" : 0, "setup" : 0, "solve" : 0 }
+        self.iterations = None
+
+        u, v = V.TnT()
+        p, q = Q.TnT()
+        start = time.perf_counter()
+        self.a = BilinearForm(V)
+        self.a += InnerProduct(grad(u),grad(v))*dx
+        self.pre = Preconditioner(self.a, precond)
+        self.a.Assemble()
+        for i in range(refinements):
+            mesh.Refine()
+            V.Update()
+            Q.Update()
+            self.a.Assemble()
+        self.b = BilinearForm(trialspace=V, testspace=Q)
+        self.b += -div(u)*q*dx
+        self.b.Assemble()
+        self.m = BilinearForm(Q)
+        self.m += p*q*dx
+        self.m.Assemble()
+        setup = time.perf_counter()
+
+        self.K = BlockMatrix([ [self.a.mat, self.b.mat.T],
+                               [self.b.mat, None] ])
+        self.P = MeanZeroProjection(Q)
+        self.C = BlockMatrix([ [self.pre.mat, None],
+                               [None, self.P @ self.m.mat.CreateSmoother() @ self.P.T] ])
+        self.times["assemble"] = setup - start
+        self.times["setup"] = time.perf_counter() - setup
+
+    def Solve(self, ubnd=lid, bnd="top"):
+        """
+            returns:
+                velocity and pressure GridFunctions, the pressure has mean zero
+        """
+        from ngsolve.krylovspace import MinResSolver
+        start = time.perf_counter()
+        gfu = GridFunction(self.V)
+        gfp = GridFunction(self.Q)
+        gfu.Set(ubnd, definedon=self.mesh.Boundaries(bnd))
+        rhs = BlockVector([gfu.vec.CreateVector(), gfp.vec.CreateVector()])
+        rhs[0].data = -self.a.mat * gfu.vec
+        rhs[0].data = Projector(self.V.FreeDofs(), True) * rhs[0]
+        rhs[1].data = -self.b.mat * gfu.vec
+        rhs[1].data = self.P.T * rhs[1]
+
+        solver = MinResSolver(self.K, self.C, tol=self.tol, maxiter=self.maxiter)
+        sol = rhs.CreateVector()
+        sol.data = solver * rhs
+        gfu.vec.data += sol[0]
+        gfp.vec.data = self.P * sol[1]
+        self.iterations = solver.iterations
+        self.times["solve"] = time.perf_counter() - start
+        return gfu, gfp
+
+    def Ndof(self):
+        return self.V.ndof + self.Q.ndof
+
+def _Run(method, maxh, kwargs):
+    mesh = StokesMesh(maxh)
+    solver = { "direct" : StokesDirect, "minres" : StokesMinRes }[method](mesh, **kwargs)
+    gfu, gfp = solver.Solve()
+    return { "method" : method, "maxh" : maxh, "ndof" : solver.Ndof(),
+             "iterations" : solver.iterations, "times" : solver.times }
+
+def CompareStokes(maxhs, methods=("direct", "minres"), options=None, verbose=True):
+    """
+        direct vs. MinRes over a sweep of maxh, every run in its own
+        (spawned) process so that the peak memory belongs to that run alone
+    arguments:
+        options: dict method -> dict of solver arguments
+    returns:
+        list of result dicts
+    """
+    options = options or {}
+    results = []
+    if verbose:
+        print("{:>8s} {:>7s} {:>9s} {:>6s} {:>10s} {:>10s} {:>10s}".format(
+            "maxh", "method", "ndof", "its", "setup [s]", "solve [s]", "peak [MB]"))
+    for maxh in maxhs:
+        for method in methods:
+            r = RunIsolated(_Run, method, maxh, options.get(method, {}))
+            results.append(r)
+            if verbose:
+                print("{:8.4f} {:>7s} {:9d} {:>6s} {:10.3f} {:10.3f} {:10.1f}".format(
+                    maxh, method, r["ndof"], "-" if r["iterations"] is None else str(r["iterations"]),
+                    r["times"]["setup"], r["times"]["solve"], r["peak_rss_mb"]))
+    return results
@@ -0,0 +1,142 @@
+"""
+    parallel convergence studies for the theta scheme of theta-scheme-heat.ipynb
+
+    Every (h, dt, theta) combination is a task of a process pool using all
+    cores, so also a sweep over dt on a single mesh runs in parallel. Every
+    worker keeps the mesh and the assembled mass and stiffness matrices per
+    mesh level (Discretization), so it assembles each h at most once. The
+    workers are spawned, not forked, as the notebook process may run
+    netgen's GUI.
+"""
+
+import os
+import multiprocessing
+from math import log, pi
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from ngsolve import (Mesh, H1, BilinearForm, LinearForm, GridFunction, Parameter,
+                     SetNumThreads, grad, dx, sin, cos, x, y, sqrt, Integrate)
+from netgen.geom2d import SplineGeometry
+
+@lru_cache(maxsize=4)
+def Discretization(i):
+    """
+        mesh, space and assembled mass and stiffness matrix for maxh = 0.5**i
+    """
+    geo = SplineGeometry()
+    geo.AddRectangle( (0, 0), (1, 1),
+                    bcs = ("bottom", "right", "top", "left"))
+    mesh = Mesh( geo.GenerateMesh(maxh=0.5**i))
+    fes = H1(mesh, order=4, dirichlet="bottom|right|left|top")
+    u,v = fes.TnT()
+
+    s = BilinearForm(fes, symmetric=False)
+    s += grad(u)*grad(v)*dx
+    s.Assemble()
+
+    m = BilinearForm(fes, symmetric=False)
+    m += u*v*dx
+    m.Assemble()
+    return mesh, fes, m, s
+
+def solve_problem(i, j, theta = 0.5):
+    """
+        maximal L2 error of the theta scheme on [0,1] with maxh = 0.5**i
+        and dt = 0.5**j (as in theta-scheme-heat.ipynb, without drawing)
+    """
+    mesh, fes, m, s = Discretization(i)
+    u,v = fes.TnT()
+    dt = 0.5**j
+
+    mstar = m.mat.CreateMatrix()
+    mstar.AsVector().data = m.mat.AsVector() + (theta)* dt * s.mat.AsVector()
+    invmstar = mstar.Inverse(freedofs=fes.FreeDofs())
+
+    t = Parameter(0.0)
+    fnow = LinearForm(fes)
+    fnow += sin(2*pi*x)*sin(2*pi*y)*(8*pi**2*cos(4*pi*t) - 4*pi*sin(4*pi*t))*v*dx
+    fnext = LinearForm(fes)
+    fnext += sin(2*pi*x)*sin(2*pi*y)*(8*pi**2*cos(4*pi*(t+dt)) - 4*pi*sin(4*pi*(t+dt)))*v*dx
+
+    u = lambda t: sin(2*pi*x)*sin(2*pi*y)*cos(4*pi*t)
+
+    gfu = GridFunction(fes)
+    gfu.Set(u(0.))
+
+    res = gfu.vec.CreateVector()
+    tstep = 1 # time that we want to step over within one block-run
+
+    l2errormax = 0
+    t_intermediate=0 # time counter within one block-run
+    while t_intermediate < tstep - 0.5 * dt:
+        t.Set(t_intermediate)
+        fnow.Assemble()
+        fnext.Assemble()
+        res.data = (1-theta)*dt * fnow.vec + (theta)*dt*fnext.vec - dt * s.mat * gfu.vec
+        gfu.vec.data += invmstar * res
+        t_intermediate += dt
+
+        l2error = sqrt( Integrate((gfu-u(t_intermediate))**2, mesh))
+        if l2error > l2errormax:
+            l2errormax = l2error
+    return l2errormax
+
+def _InitWorker():
+    # one process per core, no additional threads inside
+    SetNumThreads(1)
+
+def EOCs(errors):
+    """
+        experimental orders of convergence between neighbouring entries
+        along the last axis (levels halve h or dt)
+    """
+    errors = np.asarray(errors)
+    return np.log(errors[...,:-1]/errors[...,1:])/log(2)
+
+def PrintTable(levels_h, levels_dt, errors):
+    print("{:>8s}".format("i \\ j") + "".join("{:>12d}".format(j) for j in levels_dt))
+    for i, row in zip(levels_h, errors):
+        print("{:>8d}".format(i) + "".join("{:>12.4e}".format(e) for e in row))
+    for i, row in zip(levels_h, EOCs(errors)):
+        print("{:>8s}".format("eoc " + str(i)) + " "*12 + "".join("{:>12.2f}".format(e) for e in row))
+
+def ConvergenceStudy(levels_h, levels_dt, theta=0.5, processes=None, verbose=True):
+    """
+        errors[i,j] = solve_problem(levels_h[i], levels_dt[j], theta)
+        computed in parallel
+    arguments:
+        theta: float or list of floats
+            for a list, the result has an additional leading axis
+        processes: int
+            number of worker processes, default: all cores
+        verbose: bool
+            print every result as it arrives and the EOC table at the end
+    """
+    levels_h, levels_dt = list(levels_h), list(levels_dt)
+    thetas = list(theta) if np.ndim(theta) > 0 else [theta]
+    errors = np.full((len(thetas), len(levels_h), len(levels_dt)), np.nan)
+    if processes is None:
+        processes = os.cpu_count()
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_InitWorker,
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {}
+        # the finest meshes take longest, start them first
+        for i, lh in reversed(list(enumerate(levels_h))):
+            for k, th in enumerate(thetas):
+                for j, ldt in enumerate(levels_dt):
+                    futures[pool.submit(solve_problem, lh, ldt, th)] = (k, i, j)
+        for future in as_completed(futures):
+            k, i, j = futures[future]
+            errors[k,i,j] = future.result()
+            if verbose:
+                print("theta = {}, i = {}, j = {}: error = {:.4e}".format(thetas[k], levels_h[i], levels_dt[j], errors[k,i,j]))
+
+    if verbose:
+        for k, th in enumerate(thetas):
+            print("theta =", th)
+            PrintTable(levels_h, levels_dt, errors[k])
+    return errors if np.ndim(theta) > 0 else errors[0]
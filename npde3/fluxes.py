@@ -0,0 +1,231 @@
+"""
+    numerical fluxes fhatn(F,u1,u2,n) for the finite volume notebooks and
+    compiled, cached integrands built from them
+
+    The fluxes are IfPos expression trees which are otherwise interpreted
+    at every facet quadrature point in every step. FluxForm compiles the
+    whole facet integrand once (Compile, optionally realcompile=True for
+    generated C++ code) and caches the compiled integrand per space, flux
+    function, numerical flux, boundary values and expression hash, so
+    repeated solves on the same mesh in a session skip the C++
+    compilation. Across sessions, the object files of realcompiled kernels
+    are kept on disk keyed on the hash of the generated code (see
+    kernelcache.py), so a kernel compiled before is only linked.
+"""
+
+import hashlib
+import time
+
+from ngsolve import (CoefficientFunction, IfPos, GridFunction, L2, BilinearForm, InnerProduct,
+                     Norm, sqrt, specialcf, dx)
+
+from timestepping import Jacobian, TimeStepper
+import kernelcache
+
+def Abs(u):
+    return IfPos(u,u,-u)
+def Max(u,v):
+    return IfPos(u-v,u,v)
+def Min(u,v):
+    return IfPos(u-v,v,u)
+
+def AbsFmax(F,u1,u2):
+    absdfus = [Norm(Jacobian(F,u)) for u in [u1,u2]]
+    return Max(absdfus[0],absdfus[1])
+
+def _Scalar(cf):
+    # fluxes of scalar laws are given as scalars or as 1-vectors
+    return cf if len(cf.shape) == 0 else cf[0]
+
+### scalar conservation laws (1D)
+
+def fhatn_central(F,u1,u2,n):
+    return 0.5*F(u1)*n+0.5*F(u2)*n
+
+def fhatn_LF(F,u1,u2,n):
+    # local Lax-Friedrichs flux
+    return fhatn_central(F,u1,u2,n) + AbsFmax(F,u1,u2) *0.5*(u1-u2)
+
+def _Directed(fhat):
+    # fhat(F,ul,ur) for the flux from left to right, n = +-1 in 1D
+    def fhatn(F,u1,u2,n):
+        Fs = lambda u: _Scalar(F(u))
+        return IfPos(_Scalar(n), fhat(Fs,u1,u2), -fhat(Fs,u2,u1))
+    return fhatn
+
+def EngquistOsher(us, convex=True):
+    """
+        Engquist-Osher flux for a convex (or concave) flux F with F'(us) = 0
+        (e.g. us = 0 for Burgers, us = 0.5 for LWR with F = u(1-u))
+    """
+    us = CoefficientFunction(us)
+    def fhat(F,ul,ur):
+        if convex:
+            return F(Max(ul,us)) + F(Min(ur,us)) - F(us)
+        return F(Min(ul,us)) + F(Max(ur,us)) - F(us)
+    return _Directed(fhat)
+
+def Godunov(us, convex=True):
+    """
+        Godunov flux (exact Riemann solution) for a convex (or concave)
+        flux F with F'(us) = 0
+    """
+    us = CoefficientFunction(us)
+    def fhat(F,ul,ur):
+        if convex:
+            # min over [ul,ur] if ul <= ur, else max over [ur,ul]
+            return IfPos(ur-ul, F(Min(Max(us,ul),ur)), Max(F(ul),F(ur)))
+        return IfPos(ur-ul, Min(F(ul),F(ur)), F(Min(Max(us,ur),ul)))
+    return _Directed(fhat)
+
+### systems (1D): F(U) returns a (dim x 1) matrix, F(U)*n the normal flux
+
+def ShallowWaterF(g=9.81):
+    def F(U):
+        h, hv = U
+        return CoefficientFunction((hv, hv**2/h + 0.5*g*h**2), dims=(2,1))
+    return F
+
+def ShallowWaterSpeed(g=9.81):
+    def speed(U):
+        h, hv = U
+        return Abs(hv/h) + sqrt(g*h)
+    return speed
+
+def WaveF(c=1):
+    def F(U):
+        p, q = U
+        return CoefficientFunction((c*q, c*p), dims=(2,1))
+    return F
+
+def Rusanov(speed):
+    """
+        local Lax-Friedrichs (Rusanov) flux for systems with the maximal
+        characteristic speed speed(U)
+    """
+    def fhatn(F,u1,u2,n):
+        return fhatn_central(F,u1,u2,n) + 0.5*Max(speed(u1),speed(u2))*(u1-u2)
+    return fhatn
+
+def WaveGodunov(c=1):
+    """
+        upwind (Godunov) flux of the wave system, |A| = |c| I, so it
+        coincides with the Rusanov flux with constant speed |c|
+    """
+    def fhatn(F,u1,u2,n):
+        return fhatn_central(F,u1,u2,n) + 0.5*abs(c)*(u1-u2)
+    return fhatn
+
+### compiled and cached integrands
+
+# compiled integrands per (space, leaf objects, expression)
+_kernels = {}
+max_cached_kernels = 32
+kernel_stats = { "hits" : 0, "compiled" : 0, "compile_time" : 0 }
+# directory of the compiled kernels across sessions, None for no disk cache
+kernel_directory = kernelcache.default_directory
+
+# finite volume spaces per (mesh, dim)
+_spaces = {}
+
+def FVSpace(mesh, dim=1):
+    """
+        L2(mesh, order=0, dim=dim), one per mesh and dim, so that cached
+        kernels can be reused by later solves
+    """
+    key = (id(mesh), dim)
+    entry = _spaces.get(key)
+    if entry is not None and entry[0] is mesh:
+        return entry[1]
+    V = L2(mesh, order=0, dim=dim) if dim > 1 else L2(mesh, order=0)
+    _spaces[key] = (mesh, V)
+    return V
+
+def ExpressionHash(cf):
+    """
+        hash of the printed expression tree
+    """
+    return hashlib.sha1(str(cf).encode()).hexdigest()
+
+def CompiledIntegrand(cf, space, realcompile=True, leaves=()):
+    """
+        cf.Compile(realcompile), cached per space, expression and the
+        objects in leaves (the printed expression does not identify
+        e.g. GridFunctions, so they have to be part of the key)
+    """
+    leaves = tuple(leaves)
+    key = (id(space), tuple(id(leaf) for leaf in leaves), ExpressionHash(cf), realcompile)
+    entry = _kernels.get(key)
+    # the entry keeps the objects alive, so their ids are not reused
+    if entry is not None and entry[0] is space and all(a is b for a, b in zip(entry[1], leaves)):
+        kernel_stats["hits"] += 1
+        return entry[2]
+    if realcompile and kernel_directory is not None:
+        kernelcache.Enable(kernel_directory)
+    start = time.perf_counter()
+    compiled = cf.Compile(realcompile=realcompile, wait=True)
+    kernel_stats["compile_time"] += time.perf_counter() - start
+    kernel_stats["compiled"] += 1
+    _kernels[key] = (space, leaves, compiled)
+    while len(_kernels) > max_cached_kernels:
+        del _kernels[next(iter(_kernels))]
+    return compiled
+
+def FluxForm(F, fhatn, V, ubnd=None, compile=True, realcompile=True):
+    """
+        (non-assembled) finite volume form of the notebooks' Solve functions
+    arguments:
+        ubnd: boundary values, None for U.Other()
+        compile, realcompile: compile the integrand (cached)
+    """
+    U,W = V.TnT()
+    Uother = U.Other() if ubnd is None else U.Other(ubnd)
+    integrand = InnerProduct(fhatn(F,U,Uother,specialcf.normal(V.mesh.dim)),W)
+    if compile:
+        integrand = CompiledIntegrand(integrand, V, realcompile=realcompile, leaves=(F, fhatn, ubnd))
+    a = BilinearForm(V, nonassemble=True)
+    a += integrand * dx(element_boundary=True)
+    return a
+
+def FluxStepper(F, fhatn, u0, ubnd, mesh, dt, dim=1, compile=True, realcompile=True, **kwargs):
+    """
+        TimeStepper as FVMStepper with the compiled and cached flux form
+    arguments:
+        dim: number of components (2 for the shallow water / wave systems)
+        kwargs: passed on to TimeStepper
+    """
+    V = FVSpace(mesh, dim)
+    a = FluxForm(F, fhatn, V, ubnd, compile=compile, realcompile=realcompile)
+    gfu = GridFunction(V)
+    gfu.Set(u0)
+    return TimeStepper(gfu, V.InvM() @ a.mat, dt, **kwargs)
+
+def BenchmarkKernels(F, fhatn, u0, ubnd, mesh, dim=1, applications=100, verbose=True):
+    """
+        time per application of the flux operator for the interpreted,
+        compiled and realcompiled (twice, the second from the cache) integrand
+    returns:
+        dict variant -> (setup time, time per application)
+    """
+    variants = [ ("interpreted", False, False), ("compiled", True, False),
+                 ("realcompile", True, True), ("realcompile (cached)", True, True) ]
+    V = FVSpace(mesh, dim)
+    gfu = GridFunction(V)
+    gfu.Set(u0)
+    work = gfu.vec.CreateVector()
+    results = {}
+    for name, compile, realcompile in variants:
+        start = time.perf_counter()
+        a = FluxForm(F, fhatn, V, ubnd, compile=compile, realcompile=realcompile)
+        setup = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(applications):
+            a.mat.Mult(gfu.vec, work)
+        results[name] = (setup, (time.perf_counter() - start) / applications)
+        if verbose:
+            print("{:>22s}: setup {:8.3f}s, {:.3e}s per application".format(name, *results[name]))
+    if verbose:
+        base = results["interpreted"][1]
+        print("speedup compiled {:.1f}x, realcompile {:.1f}x".format(
+            base / results["compiled"][1], base / results["realcompile (cached)"][1]))
+    return results
@@ -0,0 +1,122 @@
+"""
+    cache of compiled kernels on disk, across sessions
+
+    For realcompile=True, NGSolve writes the generated C++ code of a
+    CoefficientFunction into a temporary directory, compiles it with
+    "ngscxx -c code.cpp -o code.o" (found in PATH) and links it with ngsld.
+    Enable() puts a wrapper ngscxx in front of PATH that looks the object
+    file up in a directory, keyed on the hash of the generated code, the
+    compiler flags and the NGSolve version, and only calls the real ngscxx
+    on a miss. A kernel compiled in an earlier session is then only linked.
+
+    The wrapper is this file, run as a script.
+"""
+
+import os
+import sys
+import shutil
+import hashlib
+import subprocess
+
+default_directory = os.environ.get("NGS_KERNEL_CACHE",
+                                   os.path.join(os.path.expanduser("~"), ".cache", "npde-kernels"))
+_directory = None
+
+def Enable(directory=None):
+    """
+        use the disk cache for all following realcompiles of this process
+        (and its child processes)
+    arguments:
+        directory: str or None
+            cache directory, default_directory if None (the environment
+            variable NGS_KERNEL_CACHE or ~/.cache/npde-kernels)
+    returns:
+        the cache directory
+    """
+    global _directory
+    if directory is None:
+        directory = default_directory
+    directory = os.path.abspath(directory)
+    if _directory == directory:
+        return directory
+    bindir = os.path.join(directory, "bin")
+    os.makedirs(bindir, exist_ok=True)
+    wrapper = os.path.join(bindir, "ngscxx")
+    script = "#!/bin/sh\nexec \"{}\" \"{}\" \"$@\"\n".format(sys.executable, os.path.abspath(__file__))
+    if not os.path.exists(wrapper) or open(wrapper).read() != script:
+        with open(wrapper, "w") as f:
+            f.write(script)
+        os.chmod(wrapper, 0o755)
+
+    import ngsolve
+    os.environ["NGS_KERNEL_CACHE"] = directory
+    os.environ["NGS_KERNEL_CACHE_VERSION"] = ngsolve.__version__
+    path = [p for p in os.environ.get("PATH", "").split(os.pathsep) if os.path.abspath(p) != bindir]
+    os.environ["PATH"] = os.pathsep.join([bindir] + path)
+    _directory = directory
+    return directory
+
+def Disable():
+    """
+        compile without the disk cache again
+    """
+    global _directory
+    if _directory is None:
+        return
+    bindir = os.path.join(_directory, "bin")
+    os.environ["PATH"] = os.pathsep.join(p for p in os.environ.get("PATH", "").split(os.pathsep)
+                                         if os.path.abspath(p) != bindir)
+    _directory = None
+
+def Clear(directory=None):
+    """
+        remove the cached object files
+    """
+    directory = directory or _directory or default_directory
+    for name in os.listdir(directory) if os.path.isdir(directory) else []:
+        if name.endswith(".o"):
+            os.remove(os.path.join(directory, name))
+
+def Entries(directory=None):
+    """
+        number of cached object files
+    """
+    directory = directory or _directory or default_directory
+    return len([name for name in os.listdir(directory) if name.endswith(".o")]) if os.path.isdir(directory) else 0
+
+def _RealCompiler(bindir):
+    path = os.pathsep.join(p for p in os.environ.get("PATH", "").split(os.pathsep)
+                           if os.path.abspath(p) != bindir)
+    compiler = shutil.which("ngscxx", path=path)
+    if compiler is None:
+        raise RuntimeError("ngscxx not found")
+    return compiler
+
+def _Main(args):
+    directory = os.environ["NGS_KERNEL_CACHE"]
+    compiler = _RealCompiler(os.path.join(directory, "bin"))
+    if "-c" not in args or "-o" not in args:
+        return subprocess.call([compiler] + args)
+    source = args[args.index("-c") + 1]
+    target = args[args.index("-o") + 1]
+    # the file names contain a per session counter, only the code counts
+    flags = [a for i, a in enumerate(args) if a not in ("-c", "-o") and args[i-1] not in ("-c", "-o")]
+    key = hashlib.sha1()
+    key.update(os.environ.get("NGS_KERNEL_CACHE_VERSION", "").encode())
+    key.update(" ".join(flags).encode())
+    with open(source, "rb") as f:
+        key.update(f.read())
+    cached = os.path.join(directory, key.hexdigest() + ".o")
+    if os.path.exists(cached):
+        shutil.copyfile(cached, target)
+        return 0
+    status = subprocess.call([compiler] + args)
+    if status == 0:
+        # write and rename, concurrent sessions never see half a file
+        tmp = "{}.{}.tmp".format(cached, os.getpid())
+        shutil.copyfile(target, tmp)
+        os.replace(tmp, cached)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(_Main(sys.argv[1:]))
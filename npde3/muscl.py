@@ -0,0 +1,251 @@
+"""
+    second order MUSCL finite volume schemes on 1D meshes for the
+    fhatn(F,u1,u2,n) fluxes of the notebooks
+
+    The cell averages (L2, order=0) are reconstructed to limited linear
+    functions per cell (L2, order=1) from the neighbouring averages; the
+    numerical flux is evaluated with the traces of the reconstruction.
+    Together with SSP-RK2 time stepping (TimeStepper(scheme="ssprk2"))
+    the scheme is second order away from shocks.
+"""
+
+import time
+
+import numpy as np
+
+from ngsolve import GridFunction, L2, BilinearForm, BaseMatrix, InnerProduct, specialcf, dx, x
+from ngsolve.meshes import Make1DMesh
+
+from timestepping import TimeStepper, FVMStepper
+
+### slope limiters, a and b are the left and right difference quotients
+
+def minmod(a, b):
+    return np.where(a*b > 0, np.sign(a)*np.minimum(np.abs(a), np.abs(b)), 0)
+
+def MC(a, b):
+    # monotonized central
+    return minmod(2*minmod(a, b), 0.5*(a+b))
+
+def vanLeer(a, b):
+    ab = np.abs(a) + np.abs(b)
+    return np.where(a*b > 0, (a*np.abs(b) + np.abs(a)*b) / np.where(ab > 0, ab, 1), 0)
+
+limiters = { "minmod" : minmod, "MC" : MC, "vanLeer" : vanLeer, "none" : lambda a, b: 0*a }
+
+class Reconstruction:
+    """
+        limited linear reconstruction of cell averages on a 1D mesh
+    arguments:
+        V0, V1: L2 spaces of order 0 and 1 (same dim)
+        limiter: name in limiters or function(a, b) of numpy arrays
+        periodic: the first and last cell are neighbours, otherwise the
+            boundary cells keep a zero slope
+    """
+    def __init__(self, V0, V1, limiter="minmod", periodic=False):
+        self.limiter = limiters[limiter] if isinstance(limiter, str) else limiter
+        self.periodic = periodic
+        self.dim = V0.dim
+        mesh = V0.mesh
+
+        # cell centers and the order 1 dofs of the constant and of x
+        # (per cell, the basis of L2 is orthogonal)
+        gfx0 = GridFunction(L2(mesh, order=0))
+        gfx0.Set(x)
+        centers = gfx0.vec.FV().NumPy().copy()
+        scalar1 = L2(mesh, order=1)
+        one, gfx1 = GridFunction(scalar1), GridFunction(scalar1)
+        one.Set(1)
+        gfx1.Set(x)
+        self.order = np.argsort(centers)
+        dofs = np.array([scalar1.GetDofNrs(el) for el in mesh.Elements()])
+        self.dofs0 = dofs[:,0]
+        self.dofs1 = dofs[:,1]
+        self.c0 = one.vec.FV().NumPy()[self.dofs0].copy()
+        self.c1 = gfx1.vec.FV().NumPy()[self.dofs1].copy()
+        # the elements are numbered as the order 0 dofs
+        self.centers = centers
+        self.ncells = len(centers)
+        self.out = np.zeros((self.ncells * 2, self.dim))
+
+    def Slopes(self, u):
+        """
+            limited slopes of the cell values u (ncells x dim)
+        """
+        us = u[self.order]
+        xs = self.centers[self.order]
+        if self.periodic:
+            L = xs[-1] - xs[0] + (xs[1] - xs[0])
+            du = np.diff(us, axis=0, append=us[:1])
+            dx_ = np.diff(xs, append=xs[0] + L)[:,None]
+            right = du / dx_
+            left = np.roll(right, 1, axis=0)
+        else:
+            right = np.zeros_like(us)
+            left = np.zeros_like(us)
+            right[:-1] = np.diff(us, axis=0) / np.diff(xs)[:,None]
+            left[1:] = right[:-1]
+        slopes = np.zeros_like(us)
+        if self.periodic:
+            slopes[:] = self.limiter(left, right)
+        else:
+            slopes[1:-1] = self.limiter(left[1:-1], right[1:-1])
+        result = np.empty_like(slopes)
+        result[self.order] = slopes
+        return result
+
+    def Apply(self, vec0, vec1):
+        """
+            vec1 (order 1) <- reconstruction of vec0 (order 0)
+        """
+        u = vec0.FV().NumPy().reshape(-1, self.dim)
+        slopes = self.Slopes(u)
+        out = self.out
+        out[self.dofs0] = u * self.c0[:,None]
+        out[self.dofs1] = slopes * self.c1[:,None]
+        vec1.FV().NumPy()[:] = out.reshape(-1)
+
+class MUSCLOperator(BaseMatrix):
+    """
+        u -> M^{-1} C(R u): the finite volume operator with the flux
+        evaluated on the limited reconstruction R u, as V.InvM() @ a.mat
+        for the first order scheme
+    arguments:
+        F, fhatn, ubnd: as in Solve (ubnd=None for U.Other())
+        V: L2 space of order 0 on a 1D mesh
+        limiter, periodic: see Reconstruction
+    """
+    def __init__(self, F, fhatn, ubnd, V, limiter="minmod", periodic=False):
+        BaseMatrix.__init__(self)
+        mesh = V.mesh
+        self.V = V
+        self.V1 = V1 = L2(mesh, order=1, dim=V.dim) if V.dim > 1 else L2(mesh, order=1)
+        self.reconstruction = Reconstruction(V, V1, limiter, periodic)
+        U = V1.TrialFunction()
+        W = V.TestFunction()
+        Uother = U.Other() if ubnd is None else U.Other(ubnd)
+        self.a = BilinearForm(trialspace=V1, testspace=V, nonassemble=True)
+        self.a += InnerProduct(fhatn(F,U,Uother,specialcf.normal(mesh.dim)),W) * dx(element_boundary=True)
+        self.invm = V.InvM()
+        self.gfr = GridFunction(V1)
+        self.work = GridFunction(V).vec.CreateVector()
+
+    def Mult(self, x, y):
+        self.reconstruction.Apply(x, self.gfr.vec)
+        self.a.mat.Mult(self.gfr.vec, self.work)
+        y.data = self.invm * self.work
+
+    def Height(self):
+        return len(self.work)
+
+    def Width(self):
+        return len(self.work)
+
+    def CreateColVector(self):
+        return self.work.CreateVector()
+
+    def CreateRowVector(self):
+        return self.work.CreateVector()
+
+def MUSCLStepper(F, fhatn, u0, ubnd, mesh, dt, dim=1, limiter="minmod", periodic=False,
+                 scheme="ssprk2", **kwargs):
+    """
+        TimeStepper for the second order scheme, arguments as for FVMStepper
+    arguments:
+        dim: number of components
+        limiter: "minmod", "MC", "vanLeer" or "none" (zero slopes)
+        periodic: the mesh is periodic
+        kwargs: passed on to TimeStepper
+    """
+    V = L2(mesh, order=0, dim=dim) if dim > 1 else L2(mesh, order=0)
+    gfu = GridFunction(V)
+    gfu.Set(u0)
+    op = MUSCLOperator(F, fhatn, ubnd, V, limiter=limiter, periodic=periodic)
+    return TimeStepper(gfu, op, dt, scheme=scheme, **kwargs)
+
+### accuracy per cost
+
+def CellAverages(gfu):
+    """
+        cell values (ncells x dim) sorted from left to right
+    """
+    V = gfu.space
+    gfx = GridFunction(L2(V.mesh, order=0))
+    gfx.Set(x)
+    order = np.argsort(gfx.vec.FV().NumPy())
+    return gfu.vec.FV().NumPy().reshape(-1, V.dim)[order]
+
+def L1Difference(coarse, fine, length=1):
+    """
+        L1 norm of the difference of cell averages on a uniform mesh and
+        on a uniform refinement of it (the first component)
+    """
+    N, Nf = len(coarse), len(fine)
+    if Nf % N != 0:
+        raise Exception("the reference needs a multiple of the cells")
+    averages = fine[:,0].reshape(N, Nf//N).mean(axis=1)
+    return length / N * np.sum(np.abs(coarse[:,0] - averages))
+
+def CompareSchemes(F, fhatn, u0, ubnd, T, Ns, speed, CFL=0.5, dim=1, periodic=False,
+                   limiter="minmod", reference=None, exact=None, verbose=True):
+    """
+        L1 errors at time T of the first order scheme (explicit Euler) and
+        the MUSCL scheme (SSP-RK2) on Make1DMesh(n=N) for N in Ns
+    arguments:
+        ubnd: function mesh -> boundary values, or None for U.Other()
+        speed: bound of the characteristic speeds, dt = CFL/(N*speed)
+        reference: N of the reference solution (MUSCL) if exact is None
+        exact: callable(mesh, t) -> cell averages (ncells x dim) or None
+    returns:
+        list of dicts with scheme, N, steps, time and error
+    """
+    def Run(N, muscl):
+        mesh = Make1DMesh(n=N, periodic=periodic)
+        dt = CFL / (N*speed)
+        bnd = ubnd(mesh) if ubnd is not None else None
+        if muscl:
+            stepper = MUSCLStepper(F, fhatn, u0, bnd, mesh, dt, dim=dim, limiter=limiter,
+                                   periodic=periodic, redraw=lambda gf: None)
+        else:
+            V = L2(mesh, order=0, dim=dim) if dim > 1 else None
+            stepper = FVMStepper(F, fhatn, u0, bnd, mesh, dt, V=V, redraw=lambda gf: None)
+        start = time.perf_counter()
+        stepper.Run(T)
+        return mesh, stepper, time.perf_counter() - start
+
+    if exact is None:
+        mesh, ref, _ = Run(reference, True)
+        ref = CellAverages(ref.gfu)
+    results = []
+    for muscl in [False, True]:
+        for N in Ns:
+            mesh, stepper, elapsed = Run(N, muscl)
+            u = CellAverages(stepper.gfu)
+            if exact is not None:
+                error = 1 / N * np.sum(np.abs(u[:,0] - exact(mesh, stepper.t)[:,0]))
+            else:
+                error = L1Difference(u, ref)
+            r = { "scheme" : "muscl-" + limiter if muscl else "first order", "N" : N,
+                  "steps" : stepper.steps, "time" : elapsed, "error" : error }
+            results.append(r)
+            if verbose:
+                print("{:>16s} N = {:6d}: {:7d} steps, {:8.3f}s, L1 error {:.4e}".format(
+                    r["scheme"], N, r["steps"], r["time"], r["error"]))
+    return results
+
+def BurgersRiemannExact(mesh, t, ul=0, ur=1, x0=0.5):
+    """
+        cell averages of the entropy solution of Burgers' equation with
+        a step from ul to ur at x0 (rarefaction for ul < ur, shock else)
+    """
+    gfx = GridFunction(L2(mesh, order=0))
+    gfx.Set(x)
+    xs = np.sort(gfx.vec.FV().NumPy())
+    h = xs[1] - xs[0]
+    # average of the exact solution per cell by a midpoint rule on sub cells
+    sub = xs[:,None] + h * (np.arange(20)[None,:] + 0.5 - 10) / 20
+    if ul < ur:
+        u = np.clip((sub - x0) / max(t, 1e-14), ul, ur)
+    else:
+        u = np.where(sub < x0 + 0.5*(ul+ur)*t, ul, ur)
+    return u.mean(axis=1)[:,None]
@@ -0,0 +1,244 @@
+"""
+    explicit time stepping with throttled rendering
+
+    The solution is only copied into a snapshot GridFunction and redrawn
+    at most fps times per second, between two steps on the calling thread
+    (GUI and TaskManager calls must not run concurrently with a step).
+    Draw the snapshot stepper.gfshow, not the solution that is updated in
+    place.
+"""
+
+import time
+
+import numpy as np
+
+from ngsolve import GridFunction, BaseMatrix, Redraw
+from ngsolve import L2, BilinearForm, InnerProduct, specialcf, dx
+from ngsolve import Parameter, Norm
+
+class TimeStepper:
+    """
+        explicit time stepping  u <- u - dt * F(u)  with throttled rendering
+    arguments:
+        gfu: GridFunction
+            solution, updated in place
+        F: BaseMatrix (e.g. V.InvM() @ a.mat) or callable step(vec, dt)
+            operator of the explicit update or function doing one step in place
+        dt: float
+            time step
+        t: float
+            initial time
+        redraw: callable(gfshow) or None
+            draws the snapshot GridFunction gfshow, e.g. a Draw1D call;
+            default is redrawing the scene of Draw() or ngsolve's Redraw()
+        fps: float
+            maximal number of frames per second
+        scheme: "euler", "ssprk2" or "ssprk3"
+            explicit Euler or strong stability preserving Runge-Kutta
+            (the latter two need F to be a BaseMatrix)
+        controller: CFLController or None
+            chooses dt before every step (dt is only the initial value then)
+    members:
+        gfshow: snapshot of gfu, updated with every frame
+    """
+    schemes = ["euler", "ssprk2", "ssprk3"]
+
+    def __init__(self, gfu, F, dt, t=0, redraw=None, fps=10, scheme="euler", controller=None):
+        if scheme not in self.schemes:
+            raise Exception("unknown scheme " + scheme + ", use one of " + ", ".join(self.schemes))
+        if scheme != "euler" and not isinstance(F, BaseMatrix):
+            raise Exception("scheme " + scheme + " needs F as a BaseMatrix")
+        self.gfu = gfu
+        self.F = F
+        self.dt = dt
+        self.scheme = scheme
+        self.controller = controller
+        self.t = t
+        self.steps = 0
+        self.redraw = redraw
+        self.fps = fps
+        self.scene = None
+        self._draw = None
+
+        self.gfshow = GridFunction(gfu.space)
+        self.gfshow.vec.data = gfu.vec
+        # work vectors of the update, allocated once
+        self.work = gfu.vec.CreateVector()
+        self.stage = gfu.vec.CreateVector()
+        self._next_frame = 0
+
+    def Draw(self, *args, **kwargs):
+        """
+            draw the snapshot GridFunction with draw.py's Draw (and its
+            backend), arguments as for Draw after the function, default
+            the mesh; it is redrawn while stepping
+        """
+        from draw import Draw, Backend
+        if len(args) == 0:
+            args = (self.gfu.space.mesh,)
+        if args[0].dim == 1:
+            # 1D: a keyed figure that is updated in place
+            kwargs.setdefault("key", id(self.gfshow))
+        if args[0].dim == 1 or Backend() == "file":
+            # redrawn by drawing again (a new frame for the file backend)
+            self._draw = (args, kwargs)
+        self.scene = Draw(self.gfshow, *args, **kwargs)
+        return self.scene
+
+    def _Euler(self, u):
+        # u <- u - dt * F u without temporaries
+        self.F.Mult(u, self.work)
+        u.Add(self.work, -self.dt)
+
+    def Step(self):
+        u = self.gfu.vec
+        if not isinstance(self.F, BaseMatrix):
+            self.F(u, self.dt)
+        elif self.scheme == "euler":
+            self._Euler(u)
+        elif self.scheme == "ssprk2":
+            s = self.stage
+            s.data = u
+            self._Euler(s)
+            self._Euler(s)
+            u *= 0.5
+            u.Add(s, 0.5)
+        else:
+            s = self.stage
+            s.data = u
+            self._Euler(s)
+            self._Euler(s)
+            s *= 0.25
+            s.Add(u, 0.75)
+            self._Euler(s)
+            u *= 1/3
+            u.Add(s, 2/3)
+        self.t += self.dt
+        self.steps += 1
+
+    def _Show(self):
+        self.gfshow.vec.data = self.gfu.vec
+        if self.redraw is not None:
+            self.redraw(self.gfshow)
+        elif self.scene is not None and hasattr(self.scene, "Redraw"):
+            self.scene.Redraw()
+        elif self._draw is not None:
+            from draw import Draw
+            Draw(self.gfshow, *self._draw[0], **self._draw[1])
+        else:
+            Redraw()
+        self._next_frame = time.perf_counter() + 1/self.fps
+
+    def _NextDt(self, T):
+        if self.controller is None:
+            return self.dt
+        # land exactly on T, record the time step that is applied
+        dt = min(self.controller(self.gfu), T-self.t)
+        self.controller.dts.append(dt)
+        return dt
+
+    def Run(self, T):
+        """
+            step until time T (up to dt/2, exactly with a controller),
+            the last state is always drawn
+        returns:
+            the reached time
+        """
+        eps = self.dt/2 if self.controller is None else 1e-12*max(1,abs(T))
+        while self.t < T-eps:
+            self.dt = self._NextDt(T)
+            self.Step()
+            if time.perf_counter() >= self._next_frame:
+                self._Show()
+        self._Show()
+        return self.t
+
+def Jacobian(F,u):
+    dummy = Parameter(1)
+    return F(dummy).Derive(dummy,u)
+
+class CFLController:
+    """
+        adaptive time step dt = CFL * h_min / max |F'(u)| from the current
+        cell values (as in AbsFmax of the notebooks)
+    arguments:
+        F: flux function as passed to Solve
+        mesh: mesh of the finite volume scheme
+        CFL: float
+            CFL number
+        speed: callable(u) -> CoefficientFunction or None
+            maximal characteristic speed, default Norm(Jacobian(F,u));
+            needed for systems
+        dtmax: float or None
+            upper bound for dt (e.g. while u is constant)
+    members:
+        dts: list of the time steps applied by TimeStepper.Run (cut at T)
+    h_min is recomputed when the number of elements of the mesh changes
+    (refinement).
+    """
+    def __init__(self, F, mesh, CFL=0.9, speed=None, dtmax=None):
+        self.CFL = CFL
+        self.speed = speed if speed is not None else (lambda u: Norm(Jacobian(F,u)))
+        self.dtmax = dtmax
+        self.dts = []
+        self.mesh = mesh
+        self.ne = None
+        self._cf = None
+
+    def _Setup(self):
+        self.ne = self.mesh.ne
+        self.gfspeed = GridFunction(L2(self.mesh,order=0))
+        self.gfspeed.Set(specialcf.mesh_size)
+        self.hmin = np.min(self.gfspeed.vec.FV().NumPy())
+
+    def __call__(self, gfu):
+        if self.ne != self.mesh.ne:
+            self._Setup()
+        if self._cf is None:
+            self._cf = self.speed(gfu)
+        self.gfspeed.Set(self._cf)
+        smax = np.max(np.abs(self.gfspeed.vec.FV().NumPy()))
+        dt = self.CFL * self.hmin / smax if smax > 0 else np.inf
+        if self.dtmax is not None:
+            dt = min(dt, self.dtmax)
+        if not np.isfinite(dt):
+            raise Exception("no wave speed to choose dt from, please set dtmax")
+        return dt
+
+    def Report(self, dt_fixed=None):
+        """
+            print statistics of the chosen time steps, compared to the number
+            of steps with the fixed time step dt_fixed
+        """
+        if len(self.dts) == 0:
+            print("no steps")
+            return
+        dts = np.array(self.dts)
+        print(len(dts), "steps, dt min/mean/max:", dts.min(), dts.mean(), dts.max())
+        if dt_fixed is not None:
+            fixed = int(np.ceil(dts.sum()/dt_fixed - 1e-8))
+            print(fixed, "steps with dt =", dt_fixed, "->", fixed-len(dts), "steps saved")
+
+def FVMStepper(F, fhatn, u0, ubnd, mesh, dt, V=None, CFL=None, **kwargs):
+    """
+        TimeStepper for the finite volume scheme of the notebooks' Solve
+        functions; the update operator V.InvM() @ a.mat is composed once
+    arguments:
+        F, fhatn, u0, ubnd, mesh, dt: as in Solve (ubnd=None for U.Other())
+        V: space, default L2(mesh,order=0)
+        CFL: float or None
+            if given, dt is only the initial time step and a CFLController
+            with this CFL number chooses all further ones
+        kwargs: passed on to TimeStepper, e.g. scheme="ssprk3"
+    """
+    if V is None:
+        V = L2(mesh,order=0)
+    gfu = GridFunction(V)
+    U,W = V.TnT()
+    Uother = U.Other() if ubnd is None else U.Other(ubnd)
+    a = BilinearForm (V, nonassemble=True)
+    a += InnerProduct(fhatn(F,U,Uother,specialcf.normal(mesh.dim)),W) * dx(element_boundary=True)
+    gfu.Set(u0)
+    if CFL is not None:
+        kwargs["controller"] = CFLController(F, mesh, CFL=CFL)
+    return TimeStepper(gfu, V.InvM() @ a.mat, dt, **kwargs)
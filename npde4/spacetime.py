@@ -0,0 +1,104 @@
+"""
+    time slab stepping for space-time DG discretizations as in dgintime.ipynb
+
+    The space-time matrix is factorized once. Of the right hand side only the
+    time-dependent source is reassembled per slab, the coupling to the last
+    slab, u_last * v * dxold, is assembled once as a (space -> space-time)
+    matrix and applied to u_last.
+"""
+
+import time
+
+from ngsolve import BilinearForm
+
+class SlabSolver:
+    """
+        solve slab after slab with a fixed factorization
+    arguments:
+        a: assembled space-time BilinearForm
+        source: LinearForm or None
+            time-dependent part of the right hand side (depending on told),
+            reassembled for every slab
+        gfu: space-time GridFunction
+        u_last: spatial GridFunction, CreateTimeRestrictedGF(gfu, 1)
+        told: Parameter
+            start time of the current slab, advanced by delta_t
+        delta_t: float
+            slab length
+        dxold: integration symbol at the slab start, dmesh(mesh, tref=0)
+        ainv: inverse of a.mat, computed with inverse if None
+        error: callable or None
+            error of the current slab, evaluated every error_stride slabs
+        redraw: callable or None
+            called after every slab, e.g. Redraw
+    """
+    def __init__(self, a, source, gfu, u_last, told, delta_t, dxold, ainv=None,
+                 inverse="umfpack", error=None, error_stride=1, redraw=None):
+        from xfem import RestrictGFInTime
+        self._RestrictGFInTime = RestrictGFInTime
+        st_fes = gfu.space
+        self.a = a
+        self.ainv = ainv if ainv is not None else a.mat.Inverse(st_fes.FreeDofs(), inverse)
+        self.source = source
+        self.gfu = gfu
+        self.u_last = u_last
+        self.told = told
+        self.delta_t = delta_t
+        self.error = error
+        self.error_stride = max(1, error_stride)
+        self.redraw = redraw
+
+        # coupling u_last * v * dxold as matrix from the spatial space
+        u = u_last.space.TrialFunction()
+        v = st_fes.TestFunction()
+        self.coupling = BilinearForm(trialspace=u_last.space, testspace=st_fes)
+        self.coupling += u * v * dxold
+        self.coupling.Assemble()
+
+        self.f = gfu.vec.CreateVector()
+        self.slabs = 0
+        self.errors = []
+        self.times = { "assemble" : 0, "solve" : 0, "error" : 0 }
+
+    def Step(self):
+        """
+            solve one slab and move to the next one
+        returns:
+            the error of the slab or None if not evaluated
+        """
+        start = time.perf_counter()
+        if self.source is not None:
+            self.source.Assemble()
+            self.f.data = self.source.vec
+        else:
+            self.f[:] = 0
+        self.coupling.mat.MultAdd(1, self.u_last.vec, self.f)
+        solve = time.perf_counter()
+        self.gfu.vec.data = self.ainv * self.f
+        self._RestrictGFInTime(spacetime_gf=self.gfu, reference_time=1.0, space_gf=self.u_last)
+        done = time.perf_counter()
+        self.times["assemble"] += solve - start
+        self.times["solve"] += done - solve
+
+        err = None
+        if self.error is not None and self.slabs % self.error_stride == 0:
+            err = self.error()
+            self.errors.append((self.told.Get() + self.delta_t, err))
+            self.times["error"] += time.perf_counter() - done
+        if self.redraw is not None:
+            self.redraw()
+        self.told.Set(self.told.Get() + self.delta_t)
+        self.slabs += 1
+        return err
+
+    def Run(self, tend, verbose=True):
+        """
+            solve slabs until tend (up to delta_t/2)
+        """
+        while tend - self.told.Get() > self.delta_t / 2:
+            err = self.Step()
+            if verbose and err is not None:
+                print("\rt = {0:12.9f}, L2 error = {1:12.9e}".format(self.told.Get(), err))
+        if verbose:
+            print(self.slabs, "slabs, time per slab:",
+                  ", ".join("{} {:.3e}s".format(k, v/max(1,self.slabs)) for k, v in self.times.items()))
@@ -0,0 +1,179 @@
+"""
+    explicit DG transport  u_t + w . grad(u) = 0  with upwinding, as in lset.ipynb
+
+    The convection form is compiled once, the update applies the operator
+    into a preallocated vector and adds the (element-wise) inverse mass
+    application directly onto the solution, without temporaries.
+"""
+
+import time
+
+from ngsolve import BilinearForm, GridFunction, H1, Region, IfPos, grad, specialcf, dx, VOL
+
+class Transport:
+    """
+        explicit upwind DG transport operator on an L2 space
+    arguments:
+        fes: L2 space
+        wind: vector CoefficientFunction
+        ubnd: CoefficientFunction or None
+            inflow values, None for u.Other(bnd=u) (no jump at the boundary)
+        compile: bool
+            compile the integrands with Compile()
+        realcompile: bool
+            generate and compile C++ code for the integrands (slow first call)
+    """
+    def __init__(self, fes, wind, ubnd=None, compile=True, realcompile=False):
+        self.fes = fes
+        u, v = fes.TnT()
+        n = specialcf.normal(fes.mesh.dim)
+        wn = wind*n
+        uother = u.Other(bnd=u) if ubnd is None else u.Other(bnd=ubnd)
+        volume = wind * grad(u) * v
+        facets = wn*(uother-u)*IfPos(wn,0,v)
+        if compile:
+            volume = volume.Compile(realcompile=realcompile, wait=True)
+            facets = facets.Compile(realcompile=realcompile, wait=True)
+
+        self.volume, self.facets = volume, facets
+        self.c = self.Form()
+        # block-diagonal for L2 spaces, applied element by element
+        self.invm = fes.InvM()
+        self.work = None
+        self.steps = 0
+        self.time = 0
+
+    def Form(self, elements=None):
+        """
+            (non-assembled) convection form, restricted to elements if given
+        """
+        c = BilinearForm(self.fes, nonassemble=True)
+        c += self.volume * dx(definedonelements=elements) \
+            + self.facets * dx(element_boundary=True, definedonelements=elements)
+        return c
+
+    def Step(self, vec, tau):
+        """
+            vec <- vec - tau * M^{-1} C vec
+        """
+        start = time.perf_counter()
+        if self.work is None:
+            self.work = vec.CreateVector()
+        self.c.mat.Mult(vec, self.work)
+        self.invm.MultAdd(-tau, self.work, vec)
+        self.time += time.perf_counter() - start
+        self.steps += 1
+
+    def Run(self, gfu, tau, tend, t=0):
+        """
+            step gfu from t to tend (up to tau/2) without drawing
+        returns:
+            the reached time
+        """
+        while t < tend - tau/2:
+            self.Step(gfu.vec, tau)
+            t += tau
+        return t
+
+    def Throughput(self):
+        """
+            updated DOFs per second over all steps so far
+        """
+        return self.steps * self.fes.ndof / self.time if self.time > 0 else 0
+
+    def Report(self):
+        print(self.steps, "steps,", "{:.3e}".format(self.time/max(1,self.steps)), "s/step,",
+              "{:.3e}".format(self.Throughput()), "DOFs/s")
+
+class NarrowBandTransport(Transport):
+    """
+        Transport of a level set function restricted to a narrow band of
+        elements around its zero level; values outside the band are frozen
+    arguments:
+        gfu: GridFunction
+            the level set function that is transported
+        delta: float
+            elements with |u| < delta somewhere form the band
+        rebuild: int
+            rebuild the band at least every rebuild steps
+        check: int
+            every check steps, rebuild if the interface left the inner
+            band (|u| < delta/2 at the last rebuild)
+        other arguments as for Transport
+    The band is marked with xfem's CutInfo of u -/+ delta, as the active
+    elements in gp_unf_poisson.ipynb. The space itself is not restricted,
+    so the facets at the band edge still see the frozen outside values.
+    The convection form and the inverse mass matrix are rebuilt on the
+    band elements and dofs only, so a step costs in proportion to the band.
+    The (block-diagonal) mass matrix is assembled once, a rebuild only
+    factorizes its band dofs.
+    """
+    def __init__(self, fes, wind, gfu, delta, ubnd=None, rebuild=50, check=10, **kwargs):
+        super().__init__(fes, wind, ubnd=ubnd, **kwargs)
+        from xfem import CutInfo, InterpolateToP1
+        self._InterpolateToP1 = InterpolateToP1
+        self.gfu = gfu
+        self.delta = delta
+        self.rebuild = rebuild
+        self.check = check
+        # CutInfo returns views that change on Update, so one per shift
+        self.lsetp1 = [GridFunction(H1(fes.mesh, order=1)) for i in range(2)]
+        self.ci = [CutInfo(fes.mesh) for i in range(2)]
+        u, v = fes.TnT()
+        self.mass = BilinearForm(fes, symmetric=True)
+        self.mass += u * v * dx
+        self.mass.Assemble()
+        self.rebuilds = 0
+        self.band_elements = 0
+        self.band_dofs = 0
+        self.updated_dofs = 0
+        self.UpdateBand()
+
+    def _Elements(self, i, shift, eltype):
+        self._InterpolateToP1(self.gfu - shift, self.lsetp1[i])
+        self.ci[i].Update(self.lsetp1[i])
+        return self.ci[i].GetElementsOfType(eltype)
+
+    def _Band(self, width):
+        from xfem import HASNEG, HASPOS
+        # elements where -width < u < width somewhere (& gives a new BitArray)
+        return self._Elements(0, width, HASNEG) & self._Elements(1, -width, HASPOS)
+
+    def UpdateBand(self):
+        self.band = self._Band(self.delta)
+        self.inner = self._Band(self.delta/2)
+        self.c = self.Form(self.band)
+        dofs = self.fes.GetDofs(Region(self.fes.mesh, VOL, self.band))
+        # inverse on the band dofs, zero elsewhere
+        self.invm = self.mass.mat.Inverse(dofs, inverse="sparsecholesky")
+        self.band_dofs = dofs.NumSet()
+        self.rebuilds += 1
+        self.band_elements += self.band.NumSet()
+
+    def InterfaceInside(self):
+        """
+            True if all elements cut by the zero level are in the inner band
+        """
+        from xfem import IF
+        interface = self._Elements(0, 0, IF)
+        return (interface | self.inner).NumSet() == self.inner.NumSet()
+
+    def Step(self, vec, tau):
+        if self.steps > 0:
+            if self.steps % self.rebuild == 0:
+                self.UpdateBand()
+            elif self.steps % self.check == 0 and not self.InterfaceInside():
+                self.UpdateBand()
+        super().Step(vec, tau)
+        self.updated_dofs += self.band_dofs
+
+    def Throughput(self):
+        """
+            updated (band) DOFs per second over all steps so far
+        """
+        return self.updated_dofs / self.time if self.time > 0 else 0
+
+    def Report(self):
+        super().Report()
+        print(self.rebuilds, "band rebuilds, on average",
+              "{:.1f}%".format(100*self.band_elements/self.rebuilds/self.fes.mesh.ne), "of the elements in the band")
@@ -0,0 +1,236 @@
+"""
+    ghost-penalty stabilized unfitted (CutFEM) Poisson problem of
+    gp_unf_poisson.ipynb for parameter studies
+
+    The cut geometry (P1 level set, CutInfo, element and facet marking) is
+    computed once per mesh and level set and cached. The bilinear form is
+    assembled in three parts with the same sparsity pattern (the space has
+    dgjumps, checked after assembly), diffusion + Nitsche consistency, the
+    Nitsche penalty and the ghost penalty, so changing gamma_stab or
+    lambda_nitsche only combines the assembled matrices anew. Changing the
+    data only reassembles the right hand side.
+"""
+
+import time
+
+import numpy as np
+
+from ngsolve import (GridFunction, H1, BilinearForm, LinearForm, Normalize, Integrate,
+                     specialcf, grad, sqrt)
+
+# cut geometries per (mesh, level set)
+_geometries = {}
+max_cached_geometries = 8
+
+class CutGeometry:
+    """
+        P1 approximation of the level set, cut information, the active and
+        cut elements and the ghost penalty facets
+    """
+    def __init__(self, mesh, levelset):
+        from xfem import InterpolateToP1, CutInfo, GetFacetsWithNeighborTypes, HASNEG, IF
+        start = time.perf_counter()
+        self.mesh = mesh
+        self.levelset = levelset
+        self.lsetp1 = GridFunction(H1(mesh))
+        InterpolateToP1(levelset, self.lsetp1)
+        self.ci = CutInfo(mesh, self.lsetp1)
+        self.hasneg = self.ci.GetElementsOfType(HASNEG)
+        self.hasif = self.ci.GetElementsOfType(IF)
+        self.ba_facets = GetFacetsWithNeighborTypes(mesh, a=self.hasneg, b=self.hasif)
+        self.spaces = {}
+        self.time = time.perf_counter() - start
+
+    def Space(self, order):
+        """
+            H1 space of order restricted to the active elements, one per order
+        """
+        if order not in self.spaces:
+            from xfem import Restrict
+            Vhbase = H1(self.mesh, order=order, dirichlet=[], dgjumps=True)
+            self.spaces[order] = Restrict(Vhbase, self.hasneg)
+        return self.spaces[order]
+
+    def Symbols(self):
+        """
+            integration symbols dx (inside), ds (interface), dw (ghost penalty facet patches)
+        """
+        from xfem import dCut, dFacetPatch, NEG, IF
+        dx = dCut(self.lsetp1, NEG, definedonelements=self.hasneg)
+        ds = dCut(self.lsetp1, IF, definedonelements=self.hasif)
+        dw = dFacetPatch(definedonelements=self.ba_facets)
+        return dx, ds, dw
+
+def GetCutGeometry(mesh, levelset):
+    """
+        cached CutGeometry of mesh and levelset (the same objects)
+    """
+    key = (id(mesh), id(levelset))
+    entry = _geometries.get(key)
+    if entry is not None and entry.mesh is mesh and entry.levelset is levelset:
+        return entry
+    geometry = CutGeometry(mesh, levelset)
+    _geometries[key] = geometry
+    while len(_geometries) > max_cached_geometries:
+        del _geometries[next(iter(_geometries))]
+    return geometry
+
+def InvalidateCutGeometry(mesh=None):
+    """
+        drop the cached geometries (of mesh, or all)
+    """
+    for key in [key for key in _geometries if mesh is None or key[0] == id(mesh)]:
+        del _geometries[key]
+
+class UnfittedPoisson:
+    """
+        -laplace u = coeff_f inside the level set, u = exact on the interface
+        (Nitsche), ghost penalty stabilization
+    arguments:
+        mesh, levelset: background mesh and level set function (negative inside)
+        coeff_f, exact: right hand side and Dirichlet data / exact solution
+        order: order of the space
+        gamma_stab, lambda_nitsche: stabilization parameters, default
+            0.1 and 10*order**2 as in the notebook
+        solver: "cg" (Jacobi preconditioned, warm started from the last
+            solution) or "direct" (sparsecholesky)
+        tol, maxiter: for cg
+    """
+    def __init__(self, mesh, levelset, coeff_f, exact, order=1, gamma_stab=0.1,
+                 lambda_nitsche=None, solver="cg", tol=1e-12, maxiter=10000):
+        if solver not in ("cg", "direct"):
+            raise ValueError("unknown solver '{}', use 'cg' or 'direct'".format(solver))
+        self.geometry = GetCutGeometry(mesh, levelset)
+        self.order = order
+        self.solver = solver
+        self.tol = tol
+        self.maxiter = maxiter
+        self.Vh = self.geometry.Space(order)
+        self.gfu = GridFunction(self.Vh)
+        self.times = { "geometry" : self.geometry.time, "assemble" : 0, "setup" : 0, "solve" : 0 }
+        self.iterations = None
+
+        start = time.perf_counter()
+        dx, ds, dw = self.geometry.Symbols()
+        self.dx = dx
+        u, v = self.Vh.TnT()
+        h = specialcf.mesh_size
+        n = Normalize(grad(self.geometry.lsetp1))
+
+        # diffusion and Nitsche consistency terms
+        self.a0 = BilinearForm(self.Vh, symmetric=True)
+        self.a0 += grad(u) * grad(v) * dx
+        self.a0 += -grad(u) * n * v * ds
+        self.a0 += -grad(v) * n * u * ds
+        self.a0.Assemble()
+        # Nitsche penalty, times lambda_nitsche
+        self.anitsche = BilinearForm(self.Vh, symmetric=True)
+        self.anitsche += 1 / h * u * v * ds
+        self.anitsche.Assemble()
+        # ghost penalty, times gamma_stab
+        self.agp = BilinearForm(self.Vh, symmetric=True)
+        self.agp += 1 / h**2 * (u - u.Other()) * (v - v.Other()) * dw
+        self.agp.Assemble()
+        self.CheckPatterns()
+        self.mat = self.a0.mat.CreateMatrix()
+        self.times["assemble"] += time.perf_counter() - start
+
+        self.f = None
+        self.SetData(coeff_f, exact)
+        self.SetParameters(gamma_stab, lambda_nitsche if lambda_nitsche is not None else 10 * order * order)
+
+    def CheckPatterns(self):
+        """
+            the assembled parts are only combined entry by entry, so they
+            need the same sparsity pattern
+        """
+        rows, cols, vals = self.a0.mat.COO()
+        for name, a in [("Nitsche penalty", self.anitsche), ("ghost penalty", self.agp)]:
+            if a.mat.nze != self.a0.mat.nze:
+                raise Exception("sparsity pattern of the {} form differs ({} instead of {} nonzeros)".format(
+                    name, a.mat.nze, self.a0.mat.nze))
+            r, c, v = a.mat.COO()
+            if not (np.array_equal(np.asarray(r), np.asarray(rows)) and np.array_equal(np.asarray(c), np.asarray(cols))):
+                raise Exception("sparsity pattern of the {} form differs".format(name))
+
+    def SetData(self, coeff_f, exact):
+        """
+            new right hand side and Dirichlet data, only the linear forms are assembled
+        """
+        start = time.perf_counter()
+        dx, ds, dw = self.geometry.Symbols()
+        v = self.Vh.TestFunction()
+        h = specialcf.mesh_size
+        n = Normalize(grad(self.geometry.lsetp1))
+        self.exact = exact
+        self.f0 = LinearForm(self.Vh)
+        self.f0 += coeff_f * v * dx
+        self.f0 += exact * (-grad(v) * n) * ds
+        self.f0.Assemble()
+        self.fnitsche = LinearForm(self.Vh)
+        self.fnitsche += exact / h * v * ds
+        self.fnitsche.Assemble()
+        if self.f is None:
+            self.f = self.f0.vec.CreateVector()
+        self.times["assemble"] += time.perf_counter() - start
+
+    def SetParameters(self, gamma_stab, lambda_nitsche):
+        """
+            new stabilization parameters, only the assembled parts are combined
+        """
+        start = time.perf_counter()
+        self.gamma_stab = gamma_stab
+        self.lambda_nitsche = lambda_nitsche
+        self.mat.AsVector().data = self.a0.mat.AsVector() + lambda_nitsche * self.anitsche.mat.AsVector() \
+            + gamma_stab * self.agp.mat.AsVector()
+        if self.solver == "direct":
+            self.inv = self.mat.Inverse(self.Vh.FreeDofs(), inverse="sparsecholesky")
+        else:
+            from ngsolve.krylovspace import CGSolver
+            self.inv = CGSolver(self.mat, self.mat.CreateSmoother(self.Vh.FreeDofs()),
+                                tol=self.tol, maxiter=self.maxiter)
+        self.times["setup"] += time.perf_counter() - start
+
+    def Solve(self):
+        """
+            solve for the current data and parameters
+        returns:
+            the L2 error against exact
+        """
+        start = time.perf_counter()
+        self.f.data = self.f0.vec + self.lambda_nitsche * self.fnitsche.vec
+        if self.solver == "direct":
+            self.gfu.vec.data = self.inv * self.f
+        else:
+            # warm start from the last solution
+            self.inv.Solve(rhs=self.f, sol=self.gfu.vec, initialize=False)
+            self.iterations = self.inv.iterations
+        self.times["solve"] += time.perf_counter() - start
+        return self.Error()
+
+    def Error(self):
+        return sqrt(Integrate((self.gfu - self.exact)**2*self.dx, self.geometry.mesh))
+
+    def Study(self, gammas, lambdas, verbose=True):
+        """
+            L2 errors for all combinations of gamma_stab in gammas and
+            lambda_nitsche in lambdas, on the cached geometry and forms
+        returns:
+            errors[i][j] for gammas[i], lambdas[j]
+        """
+        errors = []
+        for gamma in gammas:
+            errors.append([])
+            for lam in lambdas:
+                self.SetParameters(gamma, lam)
+                errors[-1].append(self.Solve())
+                if verbose:
+                    print("gamma_stab = {:8.3g}, lambda_nitsche = {:8.3g}: L2 error {:.4e}{}".format(
+                        gamma, lam, errors[-1][-1],
+                        "" if self.iterations is None else ", {} iterations".format(self.iterations)))
+        if verbose:
+            self.Report()
+        return errors
+
+    def Report(self):
+        print("ndof {}, ".format(self.Vh.ndof) + ", ".join("{} {:.3e}s".format(k, v) for k, v in self.times.items()))